@@ -4,6 +4,7 @@ from flask_smorest import Blueprint
 
 from blueprints import context_menu_model
 from blueprints.maintenance.login_api import require_tab_id
+from database.neo4j_connection import access_mode, READ
 
 blp = Blueprint(
     "Context menu actions",
@@ -14,6 +15,7 @@ blp = Blueprint(
 
 @blp.route("")
 class ContextMenuAction(MethodView):
+    @access_mode(READ)
     @blp.arguments(
         context_menu_model.ContextMenuPostSchema,
         as_kwargs=True,
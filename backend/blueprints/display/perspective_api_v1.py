@@ -6,6 +6,7 @@ from blueprints.display import perspective_model
 from blueprints.maintenance.login_api import require_tab_id
 from database.id_handling import get_base_id
 from database.mapper import GraphEditorNode, GraphEditorRelation
+from database.utils import msgspec_response
 
 blp = Blueprint(
     "Perspectives",
@@ -72,7 +73,7 @@ class Perspective(MethodView):
         relations.
         """
         persp_data = _get_perspective_with_semantic_ids(pid)
-        return persp_data
+        return msgspec_response(persp_data)
 
     @blp.arguments(
         perspective_model.PerspectivePutSchema,
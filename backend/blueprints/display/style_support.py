@@ -4,9 +4,13 @@ import math
 import random
 import os
 import hashlib
+import heapq
 import re
 import ast
 import textwrap
+from functools import lru_cache
+from threading import Lock
+from time import perf_counter
 import pyparsing as pp
 
 from RestrictedPython import (
@@ -22,6 +26,7 @@ from RestrictedPython.Eval import (
 from flask import current_app, session, g
 
 from blueprints.display import exceptions
+from database.instrumentation import record_style_time
 from database.utils import remove_newlines
 from database.attr_dict import DefaultAttrDict
 from database.base_types import BaseNode, BaseRelation, BaseElement
@@ -32,6 +37,9 @@ from utils import get_customized_file_dir
 ppu = pp.unicode
 
 
+# Maximal number of compiled style code snippets kept in memory.
+STYLE_CODE_CACHE_SIZE = 1024
+
 # Regular expressions
 RE_VAR_REFERENCE = re.compile(r"{(.*?)}")
 # Patterns for pyparsing
@@ -118,6 +126,20 @@ def parse_code_with_result(code):
     return tree
 
 
+@lru_cache(maxsize=STYLE_CODE_CACHE_SIZE)
+def compile_style_code(code: str):
+    """Compile code found in a style rule and return the byte code.
+
+    The same code is evaluated for every element styled, so results are cached
+    by code text. May raise a SyntaxError.
+    """
+    # parse/transform code and add missing line/column numbers
+    tree = ast.fix_missing_locations(
+        parse_code_with_result(textwrap.dedent(code))
+    )
+    return compile_restricted(tree, filename="<style file>", mode="exec")
+
+
 class StyleRule:
     def __init__(self, object_type, label_or_type, props):
         self.object_type = object_type
@@ -172,9 +194,7 @@ class StyleRule:
         if not condition:
             return True
 
-        eval_result = self._safe_eval(
-            textwrap.dedent(condition), obj, context
-        )
+        eval_result = self._safe_eval(condition, obj, context)
         return eval_result
 
     def _replace_caption_vars(self, caption_template: str, obj: BaseElement) -> str:
@@ -201,7 +221,7 @@ class StyleRule:
         return caption
 
     def _safe_eval(self, code: str, obj: BaseElement, context: dict):
-        """Evaluate code and return it's result.
+        """Evaluate code (as found in the style file) and return it's result.
 
         If evaluation fails for some reason, raise a subclass of SafeEvalError.
 
@@ -217,16 +237,11 @@ class StyleRule:
         # pylint: disable=broad-exception-caught
 
         try:
-            # parse/transform code and add missing line/column numbers
-            tree = ast.fix_missing_locations(parse_code_with_result(code))
-            byte_code = compile_restricted(
-                tree, filename="<style file>", mode="exec"
-            )
+            byte_code = compile_style_code(code)
 
             if "result" in context:
                 context.pop("result")
-            # https: // stackoverflow.com / q / 52229521
-            default_obj_dict = DefaultAttrDict(lambda: "", obj.__dict__.copy())
+            default_obj_dict = DefaultAttrDict(lambda: "", obj.fields_dict())
             default_props_dict = DefaultAttrDict(lambda: "", obj.properties)
             # add node fields and properties for evaluation context.
             context.update(
@@ -252,11 +267,13 @@ class StyleRule:
             )
             return context["result"]
         except SyntaxError as e:
-            raise exceptions.SafeEvalSyntaxError(repr(e), code)
+            raise exceptions.SafeEvalSyntaxError(repr(e), textwrap.dedent(code))
         # Since we are evaluating restricted python code, we
         # don't want to propagate exceptions upwards.
         except Exception as e:
-            raise exceptions.SafeEvalRuntimeError(repr(e), code, obj)
+            raise exceptions.SafeEvalRuntimeError(
+                repr(e), textwrap.dedent(code), obj
+            )
 
     def apply(self, obj: BaseElement, context: dict) -> dict:
         """Apply this rule to the obj, if possible.
@@ -280,9 +297,7 @@ class StyleRule:
                     )
                 # We want to give star rules a higher precedence than non-star.
                 elif pname.endswith("*"):
-                    res = self._safe_eval(
-                        textwrap.dedent(pval), obj, context
-                    )
+                    res = self._safe_eval(pval, obj, context)
                     res_props[pname.rstrip("*")] = str(res)
                 else:
                     res_props[pname] = pval
@@ -290,25 +305,62 @@ class StyleRule:
         return None
 
 
+# Parsed default style rules, shared by all threads of this process. Maps the
+# path of a style file to a tuple (stat_key, rules), where stat_key consists of
+# modification time and size of the file when it was parsed. Rules are stored
+# as tuple, since they are shared and must not be changed.
+default_style_cache_lock = Lock()
+default_style_cache = dict()
+
+
+def _style_file_stat_key(path):
+    """Return a key identifying the current version of file `path`.
+
+    May raise a FileNotFoundError."""
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
 def load_default_style():
-    """Load default grass file."""
+    """Load default grass file.
+
+    The file is only parsed again if it changed since the last call.
+    """
 
     default_style_file = os.path.join(get_customized_file_dir(),"style.grass")
+    path = os.path.join(os.environ["GRAPHEDITOR_BASEDIR"], default_style_file)
 
+    error = None
     try:
-        with open(
-            os.path.join(os.environ["GRAPHEDITOR_BASEDIR"], default_style_file),
-            "rb",
-        ) as file:
-            if file:
-                g.DEFAULT_STYLE_RULES, _ = read_style(file)
-            else:
-                g.DEFAULT_STYLE_RULES = []
-    except (pp.ParseException, FileNotFoundError) as e:
+        stat_key = _style_file_stat_key(path)
+    except FileNotFoundError as e:
+        stat_key = None
+        error = e
+
+    with default_style_cache_lock:
+        cached = default_style_cache.get(path)
+    if cached and cached[0] == stat_key:
+        g.DEFAULT_STYLE_RULES = cached[1]
+        return
+
+    rules = ()
+    if not error:
+        try:
+            with open(path, "rb") as file:
+                rules = tuple(read_style(file)[0])
+        except (pp.ParseException, FileNotFoundError) as e:
+            error = e
+    if error:
+        # logged once per version of the file, since the (empty) result is
+        # cached as well.
         current_app.logger.error(
-            f"error processing style file {default_style_file}: {e}"
+            f"error processing style file {default_style_file}: {error}"
         )
 
+    with default_style_cache_lock:
+        default_style_cache[path] = (stat_key, rules)
+    g.DEFAULT_STYLE_RULES = rules
+
 
 def read_style(file):
     """Read style rules from file and return them.
@@ -352,6 +404,54 @@ def parse_style(style_text):
     return rules
 
 
+class StyleRuleIndex:
+    """Style rules grouped by object type and label or type.
+
+    Finding the rules possibly applicable to an element only visits the
+    groups of its labels (or type) and the wildcard rules, instead of all
+    rules. The original ordering of rules is kept.
+    """
+
+    def __init__(self, rules: list[StyleRule]):
+        self.rules = list(rules)
+        # object type -> label/type -> [(position, rule)]
+        self._by_label_or_type = {"node": {}, "relation": {}}
+        # object type -> [(position, rule)]
+        self._wildcards = {"node": [], "relation": []}
+
+        for pos, rule in enumerate(self.rules):
+            if rule.object_type not in self._wildcards:
+                continue
+            if not rule.label_or_type or rule.label_or_type == "*":
+                self._wildcards[rule.object_type].append((pos, rule))
+            else:
+                self._by_label_or_type[rule.object_type].setdefault(
+                    rule.label_or_type, []
+                ).append((pos, rule))
+
+    def __len__(self):
+        return len(self.rules)
+
+    def candidates(self, obj: BaseElement) -> list[StyleRule]:
+        """Return rules that may be applied to obj, in their original order."""
+        if isinstance(obj, BaseNode):
+            groups = self._by_label_or_type["node"]
+            keys = set(obj.labels)
+            wildcards = self._wildcards["node"]
+        else:
+            groups = self._by_label_or_type["relation"]
+            keys = {obj.type}
+            wildcards = self._wildcards["relation"]
+
+        buckets = [groups[key] for key in keys if key in groups]
+        if not buckets:
+            return [rule for _, rule in wildcards]
+        return [
+            rule for _, rule in heapq.merge(wildcards, *buckets,
+                                            key=lambda entry: entry[0])
+        ]
+
+
 def fetch_style_rules() -> list[StyleRule]:
     """Fetch all style rules valid in the current session.
 
@@ -368,14 +468,49 @@ def fetch_style_rules() -> list[StyleRule]:
     return res
 
 
-def apply_style_rules(obj: BaseElement, style_rules: list[StyleRule]=None) -> BaseElement:
-    """Apply style rules in effect on the given object."""
+def fetch_style_rule_index() -> StyleRuleIndex:
+    """Return a StyleRuleIndex of all style rules valid in the current session.
+
+    The index is computed once per request, unless the rules in effect
+    change.
+    """
+    try:
+        session_rules = session["style_files"][get_selected_style()]["rules"]
+    except KeyError:
+        session_rules = None
+
+    cached = g.get("style_rule_index")
+    if (
+        cached
+        and cached[0] is g.DEFAULT_STYLE_RULES
+        and cached[1] is session_rules
+    ):
+        return cached[2]
+
+    index = StyleRuleIndex(fetch_style_rules())
+    g.style_rule_index = (g.DEFAULT_STYLE_RULES, session_rules, index)
+    return index
+
+
+def apply_style_rules(
+        obj: BaseElement,
+        style_rules: list[StyleRule] | StyleRuleIndex | None = None
+) -> BaseElement:
+    """Apply style rules in effect on the given object.
+
+    `style_rules` may be a list of rules or a StyleRuleIndex. If not given,
+    the rules valid in the current session are used.
+    """
     if not style_rules:
-        style_rules = fetch_style_rules()
+        style_rules = fetch_style_rule_index()
 
     if not style_rules:
         return obj
 
+    start = perf_counter()
+    if isinstance(style_rules, StyleRuleIndex):
+        style_rules = style_rules.candidates(obj)
+
     style_props = {}
     context = {}
     try:
@@ -405,6 +540,7 @@ def apply_style_rules(obj: BaseElement, style_rules: list[StyleRule]=None) -> Ba
         )
 
     obj.style = style_props
+    record_style_time(perf_counter() - start)
     return obj
 
 
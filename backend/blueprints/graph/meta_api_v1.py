@@ -6,6 +6,7 @@ from blueprints.graph import meta_model
 from blueprints.maintenance.login_api import require_tab_id
 from database.mapper import get_base_id, GraphEditorNode
 from database.id_handling import GraphEditorLabel, extract_id_metatype
+from database.neo4j_connection import access_mode, READ
 
 blp = Blueprint(
     "Meta", __name__, description="Endpoints for fetching meta information"
@@ -87,6 +88,7 @@ class MetaForMeta(MethodView):
             ]
         return result
 
+    @access_mode(READ)
     @blp.arguments(
         meta_model.MetaForMeta,
         as_kwargs=True,
@@ -1,3 +1,7 @@
+import base64
+from dataclasses import replace
+import json
+
 from flask import abort, current_app, g, session
 from flask.views import MethodView
 from flask_smorest import Blueprint
@@ -5,11 +9,19 @@ from flask_smorest import Blueprint
 from blueprints.maintenance.login_api import require_tab_id
 from blueprints.graph import node_model
 from blueprints.graph import relation_model
-from database.mapper import GraphEditorNode, GraphEditorRelation, prepare_node_patch
+from database.mapper import (
+    GraphEditorNode,
+    GraphEditorRelation,
+    VIEW_FULL,
+    element_view,
+    long_description,
+    prepare_node_patch,
+)
 from database.id_handling import (
     compute_semantic_id, get_base_id, GraphEditorLabel, parse_semantic_id, id_is_valid
 )
-from database.utils import abort_with_json
+from database.utils import abort_with_json, msgspec_response
+from database.neo4j_connection import access_mode, READ
 
 
 blp = Blueprint(
@@ -17,6 +29,26 @@ blp = Blueprint(
 )
 
 
+def _encode_cursor(skip: int) -> str:
+    """Return an opaque cursor for continuing a search after `skip` nodes."""
+    return base64.urlsafe_b64encode(
+        json.dumps({"skip": skip}).encode()
+    ).decode()
+
+
+# don't need a return after abort_with_json
+# pylint: disable=inconsistent-return-statements
+def _decode_cursor(cursor: str) -> int:
+    """Return the number of nodes to skip for the given cursor."""
+    try:
+        skip = json.loads(base64.urlsafe_b64decode(cursor.encode()))["skip"]
+        if isinstance(skip, int) and skip >= 0:
+            return skip
+    except (ValueError, TypeError, KeyError):
+        pass
+    abort_with_json(400, f"Invalid cursor: {cursor}")
+
+
 @blp.route("")
 class Nodes(MethodView):
     @blp.arguments(node_model.NodePostSchema, example=node_model.node_post_example)
@@ -41,34 +73,55 @@ class Nodes(MethodView):
         example=[node_model.node_example],
     )
     @require_tab_id()
-    def get(self, text="", labels=None, pseudo=None):
+    def get(self, text="", labels=None, pseudo=None, limit=None, cursor=None,
+            view=VIEW_FULL):
         """
         Fulltext query accross all nodes.
 
-        Returns a list of nodes.
+        Returns a list of nodes, ordered by relevance if a fulltext index
+        is available. If `limit` is given, only that many nodes are
+        returned. The X-Pagination header contains the total number of
+        hits (total, total_is_estimate) and a cursor for fetching the
+        next nodes (next_cursor, null on the last page).
         """
         if labels is None:
             labels = []
+        skip = _decode_cursor(cursor) if cursor else 0
+        search_result = current_app.graph_db.query_nodes(
+            text,
+            [get_base_id(l) for l in labels],
+            pseudo,
+            limit=limit,
+            skip=skip,
+        )
         # TODO should we return a map as in other endpoints?
+        # Only nodes of the requested page are converted (and styled).
         nodes = [
-            GraphEditorNode.from_base_node(base_node)
-            for base_node in
-            current_app.graph_db.query_nodes(
-                text,
-                [get_base_id(l) for l in labels],
-                pseudo)
+            element_view(GraphEditorNode.from_base_node(base_node, view), view)
+            for base_node in search_result.nodes
         ]
-        return nodes
+        next_skip = skip + len(nodes)
+        pagination = {
+            "total": search_result.total,
+            "total_is_estimate": search_result.estimated,
+            "next_cursor": (
+                _encode_cursor(next_skip)
+                if limit and next_skip < search_result.total else None
+            ),
+        }
+        return msgspec_response(nodes, {"X-Pagination": json.dumps(pagination)})
 
 
 @blp.route("/bulk_fetch")
 class NodesBulkFetch(MethodView):
+    @access_mode(READ)
     @blp.arguments(
         node_model.NodeBulkFetchSchema, as_kwargs=True, location="json"
     )
+    @blp.arguments(node_model.ViewQuery, as_kwargs=True, location="query")
     @blp.response(200, node_model.NodeBulkFetchResponseSchema)
     @require_tab_id()
-    def post(self, ids):
+    def post(self, ids, view=VIEW_FULL):
         """
         Fetch multiple nodes by the corresponding IDs at once.
 
@@ -80,7 +133,7 @@ class NodesBulkFetch(MethodView):
         base_nodes_map = current_app.graph_db.get_nodes_by_ids(ids)
 
         nodes = {
-            k: GraphEditorNode.from_base_node(base_node)
+            k: GraphEditorNode.from_base_node(base_node, view)
             for k, base_node in
             base_nodes_map.items()
         }
@@ -95,7 +148,10 @@ class NodesBulkFetch(MethodView):
                 if sem_node:
                     nodes[nid] = sem_node
 
-        return dict(nodes=dict(sorted(nodes.items(), key=lambda i: getattr(i[1],"title",""))))
+        return msgspec_response(dict(nodes={
+            k: element_view(node, view)
+            for k, node in sorted(nodes.items(), key=lambda i: getattr(i[1],"title",""))
+        }))
 
 
 @blp.route("/bulk_delete")
@@ -130,19 +186,34 @@ class NodesBulkPatch(MethodView):
         Each patch must contain the corresponding ID.
         Return a map of the given node IDs to the new node objects.
         """
-        id_map = current_app.graph_db.ids_to_raw_db_ids([p["id"] for p in patches])
-        result = {}
+        node_data_map = {}
         for patch in patches:
             if "id" not in patch:
-                abort_with_json(400, f"missing ID in patch: {id}")
-            orig_id = patch["id"]
-            raw_db_id = id_map[orig_id]
-            if not raw_db_id:
-                abort_with_json(400, f"Can't patch an unexisting node: {orig_id}")
-            new_node = current_app.graph_db.update_node_by_id(
-                f"id::{raw_db_id}", prepare_node_patch(patch)
+                abort_with_json(400, f"missing ID in patch: {patch}")
+            # later patches of the same node win, like if they were
+            # applied one after the other.
+            node_data_map.setdefault(patch["id"], {}).update(
+                prepare_node_patch(patch)
             )
-            new_node.id = orig_id
+
+        existing_nodes = current_app.graph_db.get_nodes_by_ids(
+            list(node_data_map.keys())
+        )
+        for orig_id in node_data_map:
+            if orig_id not in existing_nodes:
+                abort_with_json(400, f"Can't patch an unexisting node: {orig_id}")
+
+        updated_nodes = current_app.graph_db.update_nodes(
+            node_data_map, existing_nodes
+        )
+        result = {}
+        for orig_id in node_data_map:
+            if orig_id not in updated_nodes:
+                # deleted in the meantime, don't commit the other changes.
+                g.conn.doom()
+                abort_with_json(400, f"Can't patch an unexisting node: {orig_id}")
+            # several IDs may refer to the same node
+            new_node = replace(updated_nodes[orig_id], id=orig_id)
             result[orig_id] = GraphEditorNode.from_base_node(new_node)
         return dict(
             nodes=result
@@ -170,9 +241,10 @@ class NodesBulkPost(MethodView):
 
 @blp.route("/<nid>")
 class Node(MethodView):
+    @blp.arguments(node_model.ViewQuery, as_kwargs=True, location="query")
     @blp.response(200, node_model.NodeSchema, example=node_model.node_example)
     @require_tab_id()
-    def get(self, nid: str):
+    def get(self, nid: str, view=VIEW_FULL):
         """
         Get a node by id
 
@@ -184,11 +256,11 @@ class Node(MethodView):
         if not base_node:
             grapheditor_node = GraphEditorNode.create_pseudo_node(nid)
         else:
-            grapheditor_node = GraphEditorNode.from_base_node(base_node)
+            grapheditor_node = GraphEditorNode.from_base_node(base_node, view)
         if grapheditor_node is None:
             abort(404)
         grapheditor_node.id = nid
-        return grapheditor_node
+        return element_view(grapheditor_node, view)
 
     @blp.arguments(node_model.NodeSchema, example=node_model.node_put_example)
     @blp.response(200, node_model.NodeSchema, example=node_model.node_example)
@@ -250,8 +322,31 @@ class Node(MethodView):
         )
 
 
+@blp.route("/<nid>/long_description")
+class NodeLongDescription(MethodView):
+    @access_mode(READ)
+    @blp.response(200, node_model.LongDescriptionSchema)
+    @require_tab_id()
+    def get(self, nid: str):
+        """
+        Get the long description of a node
+
+        Meant for nodes fetched with view=compact.
+        """
+        if not id_is_valid(nid):
+            abort(400, "invalid id")
+        base_node = current_app.graph_db.get_node_by_id(nid)
+        if not base_node:
+            pseudo_node = GraphEditorNode.create_pseudo_node(nid)
+            if pseudo_node is None:
+                abort(404)
+            return {"longDescription": pseudo_node.longDescription}
+        return {"longDescription": long_description(base_node)}
+
+
 @blp.route("/<nid>/relations")
 class NodeRelations(MethodView):
+    @access_mode(READ)
     @blp.arguments(
         relation_model.NodeRelationsQuerySchema,
         location="json",
@@ -283,17 +378,29 @@ class NodeRelations(MethodView):
         if rel_map is None:
             abort(404)
         for rel_info in rel_map:
-            base_rel = rel_info['relation']
-            converted_rel = GraphEditorRelation.from_base_relation(base_rel)
-            rel_info['relation'] = converted_rel
-            if base_metarel := current_app.graph_db.get_node_by_id(converted_rel.type):
-                metarel = GraphEditorNode.from_base_node(base_metarel)
-            else:
-                metarel = GraphEditorNode.create_pseudo_node(converted_rel.type)
+            rel_info['relation'] = GraphEditorRelation.from_base_relation(
+                rel_info['relation']
+            )
 
+        # fetch the metarelations of all relation types at once and share
+        # them between relations of the same type.
+        rel_types = list({rel_info['relation'].type for rel_info in rel_map})
+        base_metarels = (
+            current_app.graph_db.get_nodes_by_ids(rel_types) if rel_types else {}
+        )
+        metarels = {
+            rel_type: (
+                GraphEditorNode.from_base_node(base_metarels[rel_type])
+                if rel_type in base_metarels
+                else GraphEditorNode.create_pseudo_node(rel_type)
+            )
+            for rel_type in rel_types
+        }
+
+        for rel_info in rel_map:
             base_node = rel_info['neighbor']
             rel_info['neighbor'] = GraphEditorNode.from_base_node(base_node)
-            rel_info['metarelation'] = metarel
+            rel_info['metarelation'] = metarels[rel_info['relation'].type]
         return dict(relations = rel_map)
 
 
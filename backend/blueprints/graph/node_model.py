@@ -1,6 +1,7 @@
-from marshmallow import Schema, fields
+from marshmallow import Schema, fields, validate
 
 from blueprints.graph.property_model import PropertySchema
+from database.mapper import VIEW_FULL, VIEWS
 
 
 class NodePostSchema(Schema):
@@ -19,7 +20,22 @@ class NodePostSchema(Schema):
     title = fields.Str(metadata={"description": "One line used for listings"})
 
 
-class NodeQuery(Schema):
+class ViewQuery(Schema):
+    view = fields.Str(
+        validate=validate.OneOf(VIEWS),
+        load_default=VIEW_FULL,
+        metadata={
+            # pylint: disable-next=line-too-long
+            "description": "'compact' leaves out properties, style and longDescription (see the long_description endpoints). Default: 'full'"
+        }
+    )
+
+
+class LongDescriptionSchema(Schema):
+    longDescription = fields.Str()
+
+
+class NodeQuery(ViewQuery):
     text = fields.Str(metadata={"description": "Searchtext to search for"})
     labels = fields.List(
         fields.Str(),
@@ -30,6 +46,18 @@ class NodeQuery(Schema):
             "description": "Add pseudo nodes for labels/properties/types"
         }
     )
+    limit = fields.Int(
+        validate=validate.Range(min=1),
+        metadata={
+            "description": "Maximal number of nodes returned. All if not given."
+        }
+    )
+    cursor = fields.Str(
+        metadata={
+            # pylint: disable-next=line-too-long
+            "description": "Position to continue from, as given by next_cursor of the X-Pagination header of a previous response"
+        }
+    )
 
 
 class NodeSchema(NodePostSchema):
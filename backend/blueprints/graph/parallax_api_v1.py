@@ -3,10 +3,13 @@ from flask.views import MethodView
 from flask_smorest import Blueprint
 
 from blueprints.maintenance.login_api import require_tab_id
-from blueprints.graph import parallax_model
-from database.mapper import GraphEditorNode, get_grapheditor_nodes_by_ids
-from database.utils import abort_with_json
+from blueprints.graph import node_model, parallax_model
+from database.mapper import (
+    GraphEditorNode, VIEW_FULL, element_view, get_grapheditor_nodes_by_ids
+)
+from database.utils import abort_with_json, msgspec_response
 from database.id_handling import get_base_id, compute_semantic_id, GraphEditorLabel
+from database.neo4j_connection import access_mode, READ
 
 
 blp = Blueprint(
@@ -34,72 +37,29 @@ def _normalize_filters(filters):
 
 @blp.route("")
 class Parallax(MethodView):
-    def _next_types(self, node_ids: list[str]) -> set[str]:
-        """Return a set of all relation types of incoming and outgoing
-        relations that have any of the given nodes as source/target.
-        node_ids is a list of node IDs (string).
+    def _next_types(self, summary: dict) -> dict[str, dict]:
+        """Return all relation types of incoming and outgoing relations
+        with their counts, given a summary of nodes (see get_nodes_summary).
         """
-        raw_db_ids = [get_base_id(nid) for nid in node_ids]
-        in_rel_types = current_app.graph_db.incoming_relation_types(raw_db_ids)
-        out_rel_types = current_app.graph_db.outgoing_relation_types(raw_db_ids)
-
         return {
             'incoming': {
                 compute_semantic_id(rel_type, GraphEditorLabel.MetaRelation): {
                     'count': count
                 }
-                for rel_type, count in in_rel_types.items()
+                for rel_type, count in summary['incoming'].items()
             },
             'outgoing': {
                 compute_semantic_id(rel_type, GraphEditorLabel.MetaRelation): {
                     'count': count
                 }
-                for rel_type, count in out_rel_types.items()
+                for rel_type, count in summary['outgoing'].items()
             }
         }
 
-    def _next_set(self,
-                  nodes: dict[str, dict],
-                  in_rel_types: list[str],
-                  out_rel_types: list[str],
-                  filters: dict
-        ) -> dict[str, dict]:
-        # needed for get_nodes_neighbors
-        id_map = {nid: get_base_id(nid) for nid in nodes.keys()}
-
-        # get_nodes_neighbors maps IDs of provided nodes to a map containing neighbors
-        # (where keys are IDs, values are nodes).
-        # We merge the maps into a single map of node ID -> neighbor node.
-        neighbors_map = {}
-        normalized_filters = _normalize_filters(filters)
-
-        if out_rel_types:
-            nodes_with_neighbors = current_app.graph_db.get_nodes_neighbors(
-                id_map,
-                out_rel_types,
-                "outgoing",
-                normalized_filters
-            )
-            for neighbors in nodes_with_neighbors.values():
-                for neighbor_id, neighbor in neighbors.items():
-                    neighbors_map[f"id::{neighbor_id}"] = neighbor
-
-        if in_rel_types:
-            nodes_with_neighbors = current_app.graph_db.get_nodes_neighbors(
-                id_map,
-                in_rel_types,
-                "incoming",
-                normalized_filters
-            )
-
-            for neighbors in nodes_with_neighbors.values():
-                for neighbor_id, neighbor in neighbors.items():
-                    neighbors_map[f"id::{neighbor_id}"] = neighbor
-
-        return neighbors_map
-
-    def _apply_steps(self, initial_set: dict[str, dict], steps: list):
-        result_set = initial_set
+    def _compile_steps(self, steps: list) -> list[dict]:
+        """Convert parallax steps of a request to the format expected by
+        get_parallax_nodes."""
+        result = []
         for step in steps:
             in_rel_types = [
                 get_base_id(rel_type)
@@ -111,13 +71,12 @@ class Parallax(MethodView):
             ] if 'outgoingRelationTypes' in step else []
             if not in_rel_types and not out_rel_types:
                 abort_with_json(400, "A parallax step must include at least on relation type.")
-            result_set = self._next_set(
-                result_set,
-                in_rel_types,
-                out_rel_types,
-                step.get('filters', None)
-            )
-        return result_set
+            result.append({
+                'incoming': in_rel_types,
+                'outgoing': out_rel_types,
+                'filters': _normalize_filters(step.get('filters', None)),
+            })
+        return result
 
     def _apply_filters(self, nodes_map: dict[str, dict], filters: dict):
         """Apply filters and return resulting nodes_map.
@@ -151,40 +110,63 @@ class Parallax(MethodView):
                 result[nid] = node
         return result
 
+    @access_mode(READ)
     @blp.arguments(parallax_model.ParallaxPostSchema, as_kwargs=True)
+    @blp.arguments(node_model.ViewQuery, as_kwargs=True, location="query")
     @blp.response(200, parallax_model.ParallaxPostResponseSchema)
     @require_tab_id()
     # Method name corresponds to json names, which use camelCase.
     # pylint: disable=invalid-name
-    def post(self, node_ids, filters=None, steps=None):
-        nodes = {}
-        nodes = current_app.graph_db.get_nodes_by_ids(node_ids, filters=_normalize_filters(filters))
+    def post(self, node_ids, filters=None, steps=None, view=VIEW_FULL):
+        """Return the nodes reached by steps from node_ids, and the labels,
+        properties and relation types to continue with.
+
+        view only applies to the returned nodes.
+        """
+        compiled_steps = self._compile_steps(steps or [])
+        if compiled_steps:
+            # all steps are run by the database at once, only the final
+            # node set is returned.
+            result_nodes = current_app.graph_db.get_parallax_nodes(
+                node_ids, _normalize_filters(filters), compiled_steps
+            )
+        else:
+            result_nodes = current_app.graph_db.get_nodes_by_ids(
+                node_ids, filters=_normalize_filters(filters)
+            )
 
-        result_nodes = self._apply_steps(nodes, steps or [])
         result_nids = [get_base_id(nid) for nid in result_nodes]
-        next_steps = self._next_types(result_nids)
+        if result_nids:
+            summary = current_app.graph_db.get_nodes_summary(result_nids)
+            prop_names = summary['properties']
+            labels = summary['labels']
+        else:
+            # without nodes, all properties and labels are offered.
+            summary = {'incoming': {}, 'outgoing': {}}
+            prop_names = current_app.graph_db.get_all_node_properties()
+            labels = current_app.graph_db.get_all_labels()
+        next_steps = self._next_types(summary)
 
         prop_sem_ids = [
             compute_semantic_id(prop_name, GraphEditorLabel.MetaProperty)
-            for prop_name in
-            current_app.graph_db.get_all_node_properties(result_nids)
+            for prop_name in prop_names
         ]
-        prop_nodes = get_grapheditor_nodes_by_ids(prop_sem_ids)
-
         label_sem_ids = [
             compute_semantic_id(label, GraphEditorLabel.MetaLabel)
-                for label in
-                current_app.graph_db.get_all_labels(result_nids)
+            for label in labels
         ]
-        label_nodes = get_grapheditor_nodes_by_ids(label_sem_ids)
+        # resolve MetaProperty and MetaLabel nodes at once
+        meta_nodes = get_grapheditor_nodes_by_ids(prop_sem_ids + label_sem_ids)
+        prop_nodes = meta_nodes[:len(prop_sem_ids)]
+        label_nodes = meta_nodes[len(prop_sem_ids):]
 
-        return {
+        return msgspec_response({
             'nodes': {
-                k: GraphEditorNode.from_base_node(node)
+                k: element_view(GraphEditorNode.from_base_node(node, view), view)
                 for k, node in result_nodes.items()
             },
             'properties': prop_nodes,
             'labels': label_nodes,
             'incomingRelationTypes': next_steps['incoming'],
             'outgoingRelationTypes': next_steps['outgoing'],
-        }
+        })
@@ -2,11 +2,13 @@ import traceback
 from flask import g, current_app
 from flask.views import MethodView
 from flask_smorest import Blueprint
+import msgspec
 import neo4j.exceptions
 
 from blueprints.graph import query_model
 from blueprints.maintenance.login_api import require_tab_id
 from database import mapper
+from database.cypher_database import mark_metamodel_change
 from database.id_handling import get_base_id
 from database.utils import abort_with_json
 
@@ -30,11 +32,14 @@ def execute_query(query_text:str, parameters:dict|None=None):
                 val = record.get(key)
                 obj = mapper.neoobject2grapheditor(val)
                 if isinstance(obj, (mapper.GraphEditorNode, mapper.GraphEditorRelation)):
-                    # https: // stackoverflow.com / q / 52229521
-                    api_record[key] = obj.__dict__.copy()
+                    api_record[key] = msgspec.structs.asdict(obj)
                 else:
                     api_record[key] = obj
             result.append(api_record.items())
+        # arbitrary queries may change metamodels, so we have to assume they
+        # did if anything was written.
+        if neo_result is not None and neo_result.consume().counters.contains_updates:
+            mark_metamodel_change()
         return {"result": list(result)}
     except neo4j.exceptions.ClientError as e:
         # we also log the stacktrace (and should consider doing this on other
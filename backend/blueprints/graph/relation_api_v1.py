@@ -2,13 +2,21 @@ from flask import abort, g, session, current_app
 from flask.views import MethodView
 from flask_smorest import Blueprint
 
-from blueprints.graph import relation_model
+from blueprints.graph import node_model, relation_model
 from blueprints.maintenance.login_api import require_tab_id
 from database import mapper, id_handling
 from database.id_handling import parse_db_id
-from database.utils import abort_with_json
+from database.utils import abort_with_json, msgspec_response
 from database.id_handling import compute_semantic_id, GraphEditorLabel
-from database.mapper import GraphEditorNode, GraphEditorRelation, prepare_relation_patch
+from database.mapper import (
+    GraphEditorNode,
+    GraphEditorRelation,
+    VIEW_FULL,
+    element_view,
+    long_description,
+    prepare_relation_patch,
+)
+from database.neo4j_connection import access_mode, READ
 
 blp = Blueprint(
     "Neo4j relations", __name__, description="Works with every neo4j database"
@@ -49,26 +57,30 @@ class Relations(MethodView):
         example=[relation_model.relation_example],
     )
     @require_tab_id()
-    def get(self, text=""):
+    def get(self, text="", view=VIEW_FULL):
         """
         Fulltext query across all relations
 
         Returns a list of relations
         """
         return [
-            GraphEditorRelation.from_base_relation(base_rel)
+            element_view(
+                GraphEditorRelation.from_base_relation(base_rel, view=view), view
+            )
             for base_rel in current_app.graph_db.query_relations(text)
         ]
 
 
 @blp.route("/bulk_fetch")
 class RelationsBulkFetch(MethodView):
+    @access_mode(READ)
     @blp.arguments(
         relation_model.RelationBulkFetchSchema, as_kwargs=True, location="json"
     )
+    @blp.arguments(node_model.ViewQuery, as_kwargs=True, location="query")
     @blp.response(200, relation_model.RelationBulkFetchResponseSchema)
     @require_tab_id()
-    def post(self, ids):
+    def post(self, ids, view=VIEW_FULL):
         """
         Fetch multiple nodes by the corresponding IDs at once.
 
@@ -79,11 +91,13 @@ class RelationsBulkFetch(MethodView):
         """
         base_rels = current_app.graph_db.get_relations_by_ids(ids)
         relations = {
-            k: GraphEditorRelation.from_base_relation(base_rel)
+            k: element_view(
+                GraphEditorRelation.from_base_relation(base_rel, view=view), view
+            )
             for k, base_rel in base_rels.items()
         }
 
-        return dict(relations=relations)
+        return msgspec_response(dict(relations=relations))
 
 
 @blp.route("/bulk_delete")
@@ -124,19 +138,32 @@ class RelationsBulkPatch(MethodView):
         creation of a new relation.
         """
         current_app.logger.debug(f"patches: {patches}")
-        result = {}
+        relation_data_map = {}
         for patch in patches:
             if "id" not in patch:
-                abort_with_json(400, f"missing ID in patch: {id}")
-            rid = patch["id"]
-            neo_rel = current_app.graph_db.get_relation_by_id(rid)
-            if not neo_rel:
+                abort_with_json(400, f"missing ID in patch: {patch}")
+            # later patches of the same relation win, like if they were
+            # applied one after the other.
+            relation_data_map.setdefault(patch["id"], {}).update(
+                prepare_relation_patch(patch)
+            )
+
+        existing_relations = current_app.graph_db.get_relations_by_ids(
+            list(relation_data_map.keys())
+        )
+        for rid in relation_data_map:
+            if rid not in existing_relations:
                 abort_with_json(
                     400, f"Can't patch an unexisting relation: {rid}"
                 )
-            new_rel = current_app.graph_db.update_relation_by_id(
-                rid, prepare_relation_patch(patch))
-            result[rid] = GraphEditorRelation.from_base_relation(new_rel)
+
+        updated_relations = current_app.graph_db.update_relations(
+            relation_data_map, existing_relations
+        )
+        result = {
+            rid: GraphEditorRelation.from_base_relation(updated_relations[rid])
+            for rid in relation_data_map
+        }
 
         return dict(
             relations=result
@@ -164,13 +191,14 @@ class RelationsBulkPost(MethodView):
 
 @blp.route("/<rid>")
 class Relation(MethodView):
+    @blp.arguments(node_model.ViewQuery, as_kwargs=True, location="query")
     @blp.response(
         200,
         relation_model.RelationSchema,
         example=relation_model.relation_example,
     )
     @require_tab_id()
-    def get(self, rid: str):
+    def get(self, rid: str, view=VIEW_FULL):
         """
         Get a relation by id
 
@@ -181,7 +209,9 @@ class Relation(MethodView):
             abort(404)
 
         base_relation.id = rid
-        return GraphEditorRelation.from_base_relation(base_relation)
+        return element_view(
+            GraphEditorRelation.from_base_relation(base_relation, view=view), view
+        )
 
     @blp.arguments(
         relation_model.RelationPostSchema,
@@ -256,8 +286,26 @@ class Relation(MethodView):
         )
 
 
+@blp.route("/<rid>/long_description")
+class RelationLongDescription(MethodView):
+    @access_mode(READ)
+    @blp.response(200, node_model.LongDescriptionSchema)
+    @require_tab_id()
+    def get(self, rid: str):
+        """
+        Get the long description of a relation
+
+        Meant for relations fetched with view=compact.
+        """
+        base_relation = current_app.graph_db.get_relation_by_id(rid)
+        if not base_relation:
+            abort(404)
+        return {"longDescription": long_description(base_relation)}
+
+
 @blp.route("/by_node_ids")
 class RelationsByNodeIds(MethodView):
+    @access_mode(READ)
     @blp.arguments(
         relation_model.RelationsByNodeIdsQuery,
         as_kwargs=True,
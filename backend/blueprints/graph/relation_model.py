@@ -4,7 +4,7 @@ from blueprints.graph import node_model
 from blueprints.graph.property_model import PropertySchema
 
 
-class RelationQuery(Schema):
+class RelationQuery(node_model.ViewQuery):
     text = fields.Str(metadata={"description": "Searchtext to search for"})
 
 
@@ -70,6 +70,11 @@ class RelationPostSchema(RelationBaseSchema):
 
 class RelationSchema(RelationPostSchema):
     style = fields.Dict()
+    semanticId = fields.Str(
+        metadata={
+            "description": "Semantic ID of the relation, empty if it has none."
+        }
+    )
 
 
 class RelationProperties(Schema):
@@ -56,3 +56,15 @@ class DatabaseCurrent(MethodView):
         set_current_database_name(name)
         db['features'] = current_app.graph_db.features()
         return db
+
+
+@blp.route("/current/relation_fulltext_index")
+class DatabaseRelationFulltextIndex(MethodView):
+    @blp.response(200, database_model.RelationFulltextIndexSchema)
+    @require_tab_id()
+    def post(self):
+        """Create the fulltext index used for searching relations.
+
+        The index covers all relation types existing now. Return them.
+        """
+        return {"types": g.conn.create_relation_fulltext_index()}
@@ -19,3 +19,7 @@ class DatabasesGetSchema(Schema):
 
 class DatabaseCurrentPostSchema(Schema):
     name = fields.Str()
+
+
+class RelationFulltextIndexSchema(Schema):
+    types = fields.List(fields.Str())
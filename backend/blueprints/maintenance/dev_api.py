@@ -7,13 +7,21 @@ from flask.views import MethodView
 from flask_smorest import Blueprint
 
 from blueprints.maintenance.login_api import require_tab_id
+from database.cypher_database import mark_metamodel_change
 from database.utils import abort_with_json, split_statements
+from database.neo4j_connection import (
+    access_mode,
+    invalidate_capabilities,
+    WRITE,
+)
 
 blp = Blueprint("Dev tools", __name__, description="For development only")
 TIMEOUT_LIMIT = 200
 
 def _reset_graph():
     g.conn.run("MATCH (n) DETACH DELETE n;")
+    mark_metamodel_change()
+    invalidate_capabilities(g.conn.host, g.conn.database)
     # without a commit we sometimes get an error that one can't update
     # data and change the schema in a single transaction. So we force
     # it here.
@@ -21,6 +29,8 @@ def _reset_graph():
 
 
 def _run_file(filename):
+    mark_metamodel_change()
+    invalidate_capabilities(g.conn.host, g.conn.database)
     file_path = os.path.join(os.environ["GRAPHEDITOR_BASEDIR"], filename)
     current_app.logger.debug(f'Running cypher file {file_path}')
     with open(file_path, encoding="utf-8") as file:
@@ -37,6 +47,7 @@ def _run_file(filename):
 
 @blp.route("/transaction_test")
 class Test(MethodView):
+    @access_mode(WRITE)
     @require_tab_id()
     def get(self):
         """
@@ -51,6 +62,7 @@ class Test(MethodView):
 
 @blp.route("/generate_ft")
 class SetupNeo4j(MethodView):
+    @access_mode(WRITE)
     @require_tab_id()
     def get(self):
         """Compute _ft__tech_ for nodes and relations."""
@@ -60,6 +72,7 @@ class SetupNeo4j(MethodView):
 
 @blp.route("/reset")
 class Reset(MethodView):
+    @access_mode(WRITE)
     @require_tab_id()
     def get(self):
         """
@@ -76,7 +89,7 @@ class Reset(MethodView):
         # triggers can be installed first and cause issues when manipulating
         # data.
         counter = 0
-        while not g.conn.has_ft():
+        while not g.conn.has_ft(refresh=True):
             if counter >= TIMEOUT_LIMIT:
                 abort_with_json(500, "Timeout installing functions/procedures.")
             counter = counter + 1
@@ -93,7 +106,7 @@ class Reset(MethodView):
 
         # triggers must be installed before adding data.
         counter = 0
-        while not g.conn.has_iga_triggers():
+        while not g.conn.has_iga_triggers(refresh=True):
             if counter >= TIMEOUT_LIMIT:
                 abort_with_json(500, "Timeout installing triggers.")
             counter = counter + 1
@@ -114,6 +127,7 @@ class Reset(MethodView):
 
 @blp.route("/osm_data")
 class ResetWithOSMData(MethodView):
+    @access_mode(WRITE)
     @require_tab_id()
     def get(self):
         """
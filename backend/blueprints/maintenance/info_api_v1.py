@@ -4,6 +4,7 @@ from flask_smorest import Blueprint
 from flask.views import MethodView
 from flask import current_app
 from blueprints.maintenance import info_model
+from database.neo4j_connection import drivers, pool_stats
 from database.utils import abort_with_json
 
 blp = Blueprint("Info", __name__, description="General system information")
@@ -53,3 +54,19 @@ class Version(MethodView):
             return "UNKNOWN"
 
         return f"{timestamp} {commit[:8]}"
+
+
+@blp.route("/connection_pools")
+class ConnectionPools(MethodView):
+    @blp.response(200, info_model.ConnectionPoolsSchema)
+    def get(self):
+        """Return usage of the Neo4j connection pools of this process.
+
+        Each worker process has its own pools, so this only describes the
+        worker answering the request.
+        """
+        return {
+            "drivers": len(drivers),
+            "retired_drivers": drivers.retired_count,
+            "pools": pool_stats(),
+        }
@@ -4,3 +4,28 @@ from marshmallow import Schema, fields
 class BuildInfoSchema(Schema):
     commit = fields.Str()
     timestamp = fields.Str()
+
+
+class PoolAddressSchema(Schema):
+    address = fields.Str(metadata={"description": "Address of a Neo4j server"})
+    in_use = fields.Int(metadata={"description": "Connections in use"})
+    idle = fields.Int(metadata={"description": "Idle connections"})
+
+
+class ConnectionPoolSchema(Schema):
+    host = fields.Str(metadata={"description": "Neo4j URI of the driver"})
+    max_size = fields.Int(metadata={"description": "Maximal pool size"})
+    waiting = fields.Int(
+        metadata={"description": "Requests waiting for a connection"}
+    )
+    addresses = fields.List(fields.Nested(PoolAddressSchema()))
+
+
+class ConnectionPoolsSchema(Schema):
+    drivers = fields.Int(metadata={"description": "Number of cached drivers"})
+    retired_drivers = fields.Int(
+        metadata={
+            "description": "Evicted drivers waiting for their connections to be released"
+        }
+    )
+    pools = fields.List(fields.Nested(ConnectionPoolSchema()))
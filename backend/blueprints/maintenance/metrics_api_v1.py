@@ -0,0 +1,20 @@
+from flask import Response
+from flask.views import MethodView
+from flask_smorest import Blueprint
+
+from database.instrumentation import render_metrics
+
+blp = Blueprint("Metrics", __name__, description="Request metrics")
+
+
+@blp.route("")
+class Metrics(MethodView):
+    def get(self):
+        """Return request metrics per endpoint in Prometheus' text format.
+
+        Metrics are kept per worker process, so this only describes the
+        worker answering the request.
+        """
+        return Response(
+            render_metrics(), mimetype="text/plain; version=0.0.4"
+        )
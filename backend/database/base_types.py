@@ -1,4 +1,7 @@
-from dataclasses import dataclass
+from collections.abc import Mapping
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from types import MappingProxyType
 
 # We introduce new datatypes that represent intermediate objects between
 # Neo4j types and GraphEditorNode/Relation classes. Internal code should
@@ -11,56 +14,90 @@ from dataclasses import dataclass
 # specific vendors API. Having our own types also allow us to easily enrich them
 # with things useful for internal code, like a style attribute.
 
-@dataclass
+# Large results (e.g. perspectives) contain many thousands of these objects,
+# so they are kept small: slots instead of a __dict__, properties are a
+# read-only view of the driver's property dict instead of a copy, relations
+# only keep the IDs of their nodes and equal label sets are shared.
+
+
+def _property_view(neo_entity) -> Mapping:
+    """Return a read-only view of the properties of a neo4j node or
+    relationship, without copying them."""
+    # pylint: disable-next=protected-access
+    return MappingProxyType(neo_entity._properties)
+
+
+@lru_cache(maxsize=1024)
+def _shared_labels(labels: frozenset) -> frozenset:
+    """Return an equal label set shared by all nodes with these labels.
+
+    The driver creates a new set for each node, but there are only a few
+    distinct ones.
+    """
+    return labels
+
+
+@dataclass(slots=True)
 class BaseElement():
     element_id: str
     id: str
-    properties: dict
+    # Don't modify properties, they may be read-only (see from_neo_node).
+    properties: Mapping
     style: dict
 
+    def fields_dict(self) -> dict:
+        """Return the fields of this object, since it has no __dict__."""
+        return {f.name: getattr(self, f.name) for f in fields(self)}
 
-@dataclass
+
+@dataclass(slots=True)
 class BaseNode(BaseElement):
     """Simple data representation of raw neo nodes.
     Use this for manipulating nodes internally, leaving the more
     enriched representation to the API only.
     """
-    labels: list
+    labels: frozenset | list
 
     @classmethod
     def from_neo_node(cls, neo_node):
-        props = {}
-        for key, value in neo_node.items():
-            props[key] = value
         base_node = cls(
             element_id = neo_node.element_id,
             id = neo_node.element_id,
-            properties = props,
-            labels = neo_node.labels,
+            properties = _property_view(neo_node),
+            labels = _shared_labels(neo_node.labels),
             style = {})
         return base_node
 
 
-@dataclass
+@dataclass(slots=True)
 class BaseRelation(BaseElement):
     """Simple data representation of raw neo relationships.
     Use this for manipulating relations internally, leaving the more
     enriched representation to the API only.
     """
     type: str
-    source: BaseNode
-    target: BaseNode
+    # element IDs of start and end node
+    source_id: str
+    target_id: str
 
     @classmethod
     def from_neo_relation(cls, neo_relation):
-        props = {}
-        for key, value in neo_relation.items():
-            props[key] = value
         base_relation = cls(element_id = neo_relation.element_id,
                             id = neo_relation.id,
-                            properties = props,
-                            source = neo_relation.start_node,
-                            target = neo_relation.end_node,
+                            properties = _property_view(neo_relation),
+                            source_id = neo_relation.start_node.element_id,
+                            target_id = neo_relation.end_node.element_id,
                             style = {},
                             type = neo_relation.type)
         return base_relation
+
+
+@dataclass
+class NodeSearchResult:
+    """A page of nodes found by a search."""
+    nodes: list[BaseNode]
+    # number of all hits, not only the ones in nodes
+    total: int
+    # True if total is a lower bound, e.g. since the fulltext index
+    # returns a limited number of hits.
+    estimated: bool
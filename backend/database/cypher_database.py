@@ -3,6 +3,10 @@
 # specific parts. If in the future we switch to a different engine, we
 # can still subclass it.
 
+from collections import defaultdict
+import re
+from threading import Lock
+from time import monotonic
 from uuid import uuid4
 from typing import Any
 
@@ -19,9 +23,10 @@ from database.id_handling import (
     parse_semantic_id,
     parse_unknown_id,
 )
-from database.base_types import BaseNode, BaseRelation
-from database.utils import abort_with_json, dict_to_array
+from database.base_types import BaseNode, BaseRelation, NodeSearchResult
+from database.utils import abort_with_json, dict_to_array, quote_identifier
 from database.graph_database import DatabaseFeature
+from database.settings import config
 
 
 # We don't want to spread database-specific logic across many files,
@@ -32,6 +37,58 @@ from database.graph_database import DatabaseFeature
 
 FT_QUERY_MIN_SCORE = 0.1
 FT_SEARCH_MAX_RESULTS = 5000
+# Ways of searching nodes or relations, see CypherDatabase._search_strategy.
+SEARCH_FULLTEXT = "fulltext"
+SEARCH_SCAN = "scan"
+SEARCH_ID = "id"
+SEARCH_INDEX = "index"
+
+ELEMENT_ID_PATTERN = re.compile(
+    r"^\d+:[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}:\d+$"
+)
+
+# maximal number of nodes updated by a single statement
+NODE_UPDATE_BATCH_SIZE = 1000
+# maximal number of relations updated by a single statement
+RELATION_UPDATE_BATCH_SIZE = 1000
+
+METAMODEL_LABELS = ["MetaLabel__tech_", "MetaProperty__tech_", "MetaRelation__tech_"]
+
+# Metamodels change rarely, but are needed on every request. So we cache
+# them per (host, database) across requests. An entry is valid as long as
+# its version matches the current version of its key (bumped whenever
+# Meta* nodes are changed through our API, see invalidate_metamodels) and
+# it isn't older than config.metamodel_cache_ttl seconds. The TTL covers
+# changes made outside of this process.
+metamodel_cache_lock = Lock()
+metamodel_cache = dict()
+metamodel_versions = dict()
+
+
+def metamodel_cache_key(conn) -> tuple:
+    return (conn.host, conn.database)
+
+
+def invalidate_metamodels(key: tuple):
+    """Invalidate cached metamodels of the given (host, database).
+
+    Has to be called after the transaction changing the metamodels was
+    committed, otherwise a concurrent request might cache the old state
+    again.
+    """
+    with metamodel_cache_lock:
+        metamodel_versions[key] = metamodel_versions.get(key, 0) + 1
+        metamodel_cache.pop(key, None)
+
+
+def mark_metamodel_change(labels=None):
+    """Remember that the current request changed metamodels.
+
+    If `labels` is given, only mark a change if any of them is a Meta*
+    label.
+    """
+    if labels is None or not set(labels).isdisjoint(METAMODEL_LABELS):
+        g.metamodel_changed = True
 
 
 class CypherDatabase(GraphDatabase):
@@ -59,6 +116,7 @@ class CypherDatabase(GraphDatabase):
             # a node containing it.
             updated_properties.update({'_uuid__tech_': str(uuid4())})
             node_data['properties'] = updated_properties
+            mark_metamodel_change(node_data['labels'])
 
         query_text = """
         UNWIND $node_data_list AS node_data
@@ -324,6 +382,7 @@ class CypherDatabase(GraphDatabase):
             existing_node.properties,
             node_data["properties"]
         )
+        mark_metamodel_change(set(existing_node.labels) | new_labels)
 
         result = self._run(
             f"""MATCH (n) WHERE elementid(n)=$nid
@@ -359,9 +418,64 @@ class CypherDatabase(GraphDatabase):
             )
             return None
 
-        raw_db_id = existing_node.id
+        updated_nodes = self._update_nodes(
+            [self._node_update_row(existing_node, node_data)]
+        )
+        if not updated_nodes:
+            current_app.logger.debug("No matching relations.")
+            return None
+        return updated_nodes[existing_node.element_id]
+
+    def update_nodes(
+            self,
+            node_data_map: dict[str, dict],
+            existing_nodes: dict[str, BaseNode] | None = None
+    ) -> dict[str, BaseNode]:
+        """Update multiple nodes at once.
+
+        `node_data_map` maps node IDs to partial node data, see
+        update_node_by_id. `existing_nodes` maps the same IDs to the nodes
+        in their current state. If not given, they are fetched.
+
+        Return a map of the given IDs to the updated nodes. IDs of nodes not
+        existing in the database are left out. Several IDs may refer to the
+        same node (e.g. a semantic ID and its id:: form), their changes are
+        merged in the given order and all of them map to the updated node.
+        """
+        if existing_nodes is None:
+            existing_nodes = self.get_nodes_by_ids(list(node_data_map.keys()))
+
+        # raw database ID -> (existing node, merged node data)
+        changes = {}
+        raw_db_id_to_input_ids = defaultdict(list)
+        for nid, node_data in node_data_map.items():
+            existing_node = existing_nodes.get(nid)
+            if not existing_node:
+                continue
+            raw_db_id = existing_node.element_id
+            changes.setdefault(raw_db_id, (existing_node, {}))[1].update(node_data)
+            raw_db_id_to_input_ids[raw_db_id].append(nid)
+
+        rows = [
+            self._node_update_row(existing_node, node_data)
+            for existing_node, node_data in changes.values()
+        ]
+        return {
+            nid: node
+            for raw_db_id, node in self._update_nodes(rows).items()
+            for nid in raw_db_id_to_input_ids[raw_db_id]
+        }
+
+    def _node_update_row(self, existing_node: BaseNode, node_data: dict) -> dict:
+        """Return the changes `node_data` makes to `existing_node`, as
+        expected by _update_nodes.
+
+        Tech properties of `existing_node` are kept, see
+        compute_updated_properties."""
+        mark_metamodel_change(
+            set(existing_node.labels) | set(node_data.get("labels", []))
+        )
 
-        label_update = ""
         added_labels = []
         removed_labels = []
         if "labels" in node_data:
@@ -369,16 +483,6 @@ class CypherDatabase(GraphDatabase):
             new_labels = set(node_data["labels"])
             removed_labels = list(old_labels - new_labels - {"___tech_"})
             added_labels = list(new_labels - old_labels)
-        if added_labels:
-            label_update += """
-            CALL apoc.create.addLabels(n, $added_labels)
-            YIELD node
-            """
-        if removed_labels:
-            label_update += """
-            CALL apoc.create.removeLabels(n, $removed_labels)
-            YIELD node
-            """
 
         properties = None
         if "properties" in node_data:
@@ -387,32 +491,39 @@ class CypherDatabase(GraphDatabase):
                 node_data["properties"]
             )
 
-        if properties:
-            result = self._run(
-                f"""MATCH (n) WHERE elementid(n)=$nid
-                    SET n=$properties
-                    { "WITH n " + label_update if label_update else '' }
-                    RETURN n""",
-                nid=raw_db_id,
-                properties=properties,
-                added_labels=added_labels,
-                removed_labels=removed_labels
-            )
+        return {
+            "nid": existing_node.element_id,
+            # an empty dict doesn't change properties, like a missing one.
+            "properties": properties or None,
+            "added_labels": added_labels,
+            "removed_labels": removed_labels,
+        }
 
-        else:
+    def _update_nodes(self, rows: list[dict]) -> dict[str, BaseNode]:
+        """Apply node changes computed by _node_update_row.
+
+        All rows are applied with a single statement per
+        NODE_UPDATE_BATCH_SIZE rows. Return a map of raw database IDs to
+        the updated nodes."""
+        updated_nodes = {}
+        for start in range(0, len(rows), NODE_UPDATE_BATCH_SIZE):
             result = self._run(
-                f"""MATCH (n) WHERE elementid(n)=$nid
-                    { "WITH n " + label_update if label_update else '' }
-                    RETURN n""",
-                nid=raw_db_id,
-                added_labels=added_labels,
-                removed_labels=removed_labels
+                """UNWIND $rows AS row
+                MATCH (n) WHERE elementid(n) = row.nid
+                CALL (n, row) {
+                    WITH n, row WHERE row.properties IS NOT NULL
+                    SET n = row.properties
+                }
+                CALL apoc.create.addLabels(n, row.added_labels)
+                YIELD node AS node_with_added_labels
+                CALL apoc.create.removeLabels(n, row.removed_labels)
+                YIELD node AS node_with_removed_labels
+                RETURN row.nid AS nid, n""",
+                rows=rows[start:start + NODE_UPDATE_BATCH_SIZE],
             )
-
-        if not result:
-            current_app.logger.debug("No matching relations.")
-            return None
-        return BaseNode.from_neo_node(result.single()["n"])
+            for row in result:
+                updated_nodes[row["nid"]] = BaseNode.from_neo_node(row["n"])
+        return updated_nodes
 
     def delete_nodes_by_ids(self, ids):
         """Delete multiple nodes by their ids"""
@@ -422,11 +533,17 @@ class CypherDatabase(GraphDatabase):
             return None
 
         result = self._run(
-            f"""MATCH (n) WHERE elementid(n) IN {raw_db_ids}
-            CALL (n) {{ DETACH DELETE n }}
-            RETURN COUNT(n) AS c"""
+            """MATCH (n) WHERE elementid(n) IN $raw_db_ids
+            WITH n, any(l IN labels(n) WHERE l IN $metamodel_labels) AS is_meta
+            CALL (n) { DETACH DELETE n }
+            RETURN COUNT(n) AS c, true IN collect(is_meta) AS metamodel_changed""",
+            raw_db_ids=raw_db_ids,
+            metamodel_labels=METAMODEL_LABELS
         )
-        return result.single()["c"]
+        row = result.single()
+        if row["metamodel_changed"]:
+            mark_metamodel_change()
+        return row["c"]
 
     def _extract_relation_filter_data(self, filters : dict) -> tuple:
         """Helper function to extract data needed for filtering neighbor in cypher.
@@ -475,120 +592,95 @@ class CypherDatabase(GraphDatabase):
 
 
     def _get_node_relations_by_raw_db_id(self, raw_db_id, filters):
-        """Get node relations from node with internal db_id."""
-
-        incoming_with_source = []
-        outgoing_with_target = []
-        direction = filters["direction"]
-
-        rel_props, rel_type, neighbor_labels, neighbor_props, where_clauses = (
-            self._extract_relation_filter_data(filters)
+        """Get node relations from node with internal db_id.
+        Return None if the node doesn't exist."""
+        return self._get_node_relations(
+            "MATCH (n) WHERE elementid(n)=$nid", filters, nid=raw_db_id
         )
 
-        if direction in {"both", "incoming"}:
-            incoming_res = self._run(
-                "MATCH (neighbor)-[r]->(n)"
-                " WHERE elementid(n)=$nid " +
-                where_clauses +
-                "RETURN r, neighbor",
-                nid=raw_db_id,
-                rel_type=rel_type,
-                rel_props=rel_props,
-                neighbor_labels=neighbor_labels,
-                neighbor_props=neighbor_props,
-            )
-            incoming_with_source = [
-                {
-                    "relation": BaseRelation.from_neo_relation(row["r"]),
-                    "neighbor": BaseNode.from_neo_node(row["neighbor"]),
-                    "direction": "incoming",
-                }
-                for row in incoming_res
-            ]
-
-        if direction in {"both", "outgoing"}:
-            outgoing_res = self._run(
-                "MATCH (n)-[r]->(neighbor) "
-                "WHERE elementid(n)=$nid " +
-                where_clauses +
-                "RETURN r, neighbor",
-                nid=raw_db_id,
-                rel_type=rel_type,
-                rel_props=rel_props,
-                neighbor_labels=neighbor_labels,
-                neighbor_props=neighbor_props,
-            )
-            outgoing_with_target = [
-                {
-                    "relation": BaseRelation.from_neo_relation(row["r"]),
-                    "neighbor": BaseNode.from_neo_node(row["neighbor"]),
-                    "direction": "outgoing",
-                }
-                for row in outgoing_res
-            ]
-        return incoming_with_source + outgoing_with_target
-
     def _get_node_relations_by_semantic_id(self, semantic_id:str, filters:dict) -> list[dict]:
         """Get node relations from node with semantic_id.
         Return None if invalid."""
-        incoming_with_source = []
-        outgoing_with_target = []
-        direction = filters["direction"]
         metatype = extract_id_metatype(semantic_id)
         base_id = id_handling.get_base_id(semantic_id)
 
         if not metatype or not base_id:
             return None
 
-        node_filter = ":" + metatype.value
+        # metatype.value is one of our few metalabels, so the number of
+        # distinct queries stays bounded.
+        rels = self._get_node_relations(
+            f"MATCH (n:{metatype.value}) WHERE n.name__tech_=$name",
+            filters,
+            name=base_id
+        )
+        # semantic IDs are valid even if the node doesn't exist yet.
+        return rels or []
+
+    def _get_node_relations(self, node_match:str, filters:dict, **params) -> list[dict] | None:
+        """Get relations of the node matched by `node_match` (binding `n`)
+        according to `filters`.
+
+        Incoming and outgoing relations are fetched by a single statement,
+        which also tells if the node exists. Return None if it doesn't.
+        """
+        direction = filters["direction"]
+        patterns = {
+            "both": "(n)-[r]-(neighbor)",
+            "incoming": "(n)<-[r]-(neighbor)",
+            "outgoing": "(n)-[r]->(neighbor)",
+        }
+        if direction not in patterns:
+            return []
+
         rel_props, rel_type, neighbor_labels, neighbor_props, where_clauses = (
             self._extract_relation_filter_data(filters)
         )
+        result = self._run(
+            f"""{node_match}
+            OPTIONAL MATCH {patterns[direction]}
+            WHERE true {where_clauses}
+            RETURN r, neighbor,
+                   startNode(r) = n AS is_outgoing,
+                   endNode(r) = n AS is_incoming""",
+            rel_type=rel_type,
+            rel_props=rel_props,
+            neighbor_labels=neighbor_labels,
+            neighbor_props=neighbor_props,
+            **params
+        )
 
-        if direction in {"both", "incoming"}:
-            incoming_res = self._run(
-                # pylint: disable=line-too-long
-                f"""
-                MATCH (neighbor)-[r]->(n{node_filter})
-                WHERE n.name__tech_=$name
-                { where_clauses }
-                RETURN r, neighbor""",
-                name=base_id,
-                rel_type=rel_type,
-                rel_props=rel_props,
-                neighbor_props=neighbor_props,
-                neighbor_labels=neighbor_labels
-            )
-            incoming_with_source = [
-                {
+        node_exists = False
+        seen_relations = set()
+        incoming_with_source = []
+        outgoing_with_target = []
+        for row in result:
+            node_exists = True
+            if row["r"] is None:
+                continue
+            # an undirected pattern may return a relation from a node to
+            # itself twice.
+            if row["r"].element_id in seen_relations:
+                continue
+            seen_relations.add(row["r"].element_id)
+
+            # relations from a node to itself are both incoming and
+            # outgoing.
+            if row["is_incoming"] and direction in {"both", "incoming"}:
+                incoming_with_source.append({
                     "relation": BaseRelation.from_neo_relation(row["r"]),
                     "neighbor": BaseNode.from_neo_node(row["neighbor"]),
                     "direction": "incoming",
-                }
-                for row in incoming_res
-            ]
-
-        if direction in {"both", "outgoing"}:
-            # pylint: disable=line-too-long
-            outgoing_res = self._run(
-                f"""MATCH (n{node_filter})-[r]->(neighbor)
-                WHERE n.name__tech_=$name
-                { where_clauses }
-                RETURN r, neighbor""",
-                name=base_id,
-                rel_type=rel_type,
-                rel_props=rel_props,
-                neighbor_labels=neighbor_labels,
-                neighbor_props=neighbor_props,
-            )
-            outgoing_with_target = [
-                {
+                })
+            if row["is_outgoing"] and direction in {"both", "outgoing"}:
+                outgoing_with_target.append({
                     "relation": BaseRelation.from_neo_relation(row["r"]),
                     "neighbor": BaseNode.from_neo_node(row["neighbor"]),
                     "direction": "outgoing",
-                }
-                for row in outgoing_res
-            ]
+                })
+
+        if not node_exists:
+            return None
         return incoming_with_source + outgoing_with_target
 
     def get_node_relations(self, nid: str, filters: dict) -> list[dict]:
@@ -602,31 +694,34 @@ class CypherDatabase(GraphDatabase):
         raw_db_id = parse_db_id(nid)
 
         if raw_db_id:
-            rels = self._get_node_relations_by_raw_db_id(raw_db_id, filters)
-            if not rels:
-                # We have to distinguish if nothing was returned
-                # because there are no relations (which should end in
-                # a 200 response) or the db_id doesn't exist in the
-                # database (404).
-                if not self._get_node_by_raw_db_id(raw_db_id):
-                    return None
-            return rels
+            return self._get_node_relations_by_raw_db_id(raw_db_id, filters)
 
         # if nid was not of kind id::, treat it as an semantic id
         return self._get_node_relations_by_semantic_id(nid, filters)
 
-    def _neighbors_query_string(self, relation_types=None, direction="incoming",
+    def _neighbors_query_string(self, outgoing_relation_types=None,
+                                incoming_relation_types=None,
                                 neighbors_filters=None):
-        """Return a query string for fetching neighbors from multiple nodes."""
-        # swap target/node variables according to direction
-        source_var = "n" if direction == "incoming" else "m"
-        target_var = "m" if direction == "incoming" else "n"
-        if relation_types is None:
-            relation_types = []
-        rel_type_expr = (
-            " AND type(r) IN $relation_types "
-            if relation_types else ""
-        )
+        """Return a query string for fetching neighbors from multiple nodes.
+
+        Neighbors are expanded in a direction if its list of relation types
+        isn't None. An empty list allows any relation type.
+        """
+        branches = []
+        if outgoing_relation_types is not None:
+            branches.append(
+                "MATCH (m)-[r]->(n) " + (
+                    "WHERE type(r) IN $outgoing_relation_types "
+                    if outgoing_relation_types else ""
+                ) + "RETURN n"
+            )
+        if incoming_relation_types is not None:
+            branches.append(
+                "MATCH (m)<-[r]-(n) " + (
+                    "WHERE type(r) IN $incoming_relation_types "
+                    if incoming_relation_types else ""
+                ) + "RETURN n"
+            )
 
         label_filters = neighbors_filters.get('labels', None) if neighbors_filters else None
         property_filters = neighbors_filters.get('properties', None) if neighbors_filters else None
@@ -640,15 +735,19 @@ class CypherDatabase(GraphDatabase):
             WHERE n[pname] CONTAINS $property_filters[pname])
         """ if property_filters else ""
 
+        union = "\n            UNION\n            ".join(branches)
         return f"""
         UNWIND $id_pairs AS id_pair
         WITH id_pair[0] AS original_id, id_pair[1] AS raw_db_id
-        MATCH ({source_var})-[r]->({target_var})
-        WHERE elementid(m) = raw_db_id
+        MATCH (m) WHERE elementid(m) = raw_db_id
+        CALL (m) {{
+            {union}
+        }}
+        WITH original_id, n
+        WHERE true
         {label_filters_expr}
         {property_filter_expr}
-        {rel_type_expr}
-        RETURN original_id, n
+        RETURN DISTINCT original_id, n
         """
 
     def get_relations_by_node_ids(
@@ -677,7 +776,8 @@ class CypherDatabase(GraphDatabase):
             self, id_map: dict[str, str],
             relation_types: list[str],
             direction="both",
-            neighbors_filters=None
+            neighbors_filters=None,
+            incoming_relation_types: list[str] | None = None
     ) -> dict[str, dict[str, BaseNode]]:
         """Return all neighbors from nodes in id_map.
 
@@ -686,6 +786,14 @@ class CypherDatabase(GraphDatabase):
                     those found in the database.
 
             relation_types: List of relation types. For example: ['likes__dummy_'].
+                    An empty list allows any relation type.
+
+            direction: "outgoing", "incoming" or "both". Others raise a
+                    ValueError.
+
+            incoming_relation_types: Relation types of incoming relations
+                    if direction is "both" and they differ from
+                    relation_types.
 
         Returns:
             A dict mapping node IDs (original ones found in id_map) to
@@ -701,66 +809,264 @@ class CypherDatabase(GraphDatabase):
         # before processing it.
         id_pairs = dict_to_array(id_map)
 
+        if direction not in ["both", "outgoing", "incoming"]:
+            raise ValueError(f"Unknown direction {direction}")
+        relation_types = relation_types or []
+        outgoing_relation_types = (
+            relation_types if direction in ["both", "outgoing"] else None
+        )
+        if direction == "incoming":
+            incoming_relation_types = relation_types
+        elif direction == "both":
+            if incoming_relation_types is None:
+                incoming_relation_types = relation_types
+        else:
+            incoming_relation_types = None
+
         result = {}
         property_filters = neighbors_filters.get('properties', None) if neighbors_filters else None
         label_filters = neighbors_filters.get('labels', None) if neighbors_filters else None
 
-        if direction in ["both", "outgoing"]:
-            query_str = self._neighbors_query_string(relation_types, "outgoing", neighbors_filters)
-            res = g.conn.run(query_str,
-                             id_pairs=id_pairs,
-                             relation_types=relation_types,
-                             label_filters=label_filters,
-                             property_filters=property_filters)
-
-            for row in res:
-                node = BaseNode.from_neo_node(row["n"])
-                oid = row["original_id"]
-                if oid in result:
-                    result[oid][node.id] = node
-                else:
-                    result[oid] = {node.id: node}
-        else:
-            query_str = self._neighbors_query_string(relation_types, "incoming", neighbors_filters)
-            res = g.conn.run(query_str,
-                             id_pairs=id_pairs,
-                             relation_types=relation_types,
-                             label_filters=label_filters,
-                             property_filters=property_filters)
-
-            for row in res:
-                node = BaseNode.from_neo_node(row["n"])
-                oid = row["original_id"]
-                if oid in result:
-                    result[oid][node.id] = node
-                else:
-                    result[oid] = {node.id: node}
+        # both directions are expanded by a single statement
+        query_str = self._neighbors_query_string(
+            outgoing_relation_types, incoming_relation_types, neighbors_filters
+        )
+        res = g.conn.run(query_str,
+                         id_pairs=id_pairs,
+                         outgoing_relation_types=outgoing_relation_types,
+                         incoming_relation_types=incoming_relation_types,
+                         label_filters=label_filters,
+                         property_filters=property_filters)
+
+        for row in res:
+            node = BaseNode.from_neo_node(row["n"])
+            oid = row["original_id"]
+            if oid in result:
+                result[oid][node.id] = node
+            else:
+                result[oid] = {node.id: node}
         return result
 
-    def incoming_relation_types(self, node_ids):
-        query_text = """
-        MATCH (a)-[r]->(b)
-        WHERE elementid(b) IN $node_ids
-        RETURN type(r) AS rel_type, count(a) AS num_neighbors
+    def get_parallax_nodes(
+            self, ids: list[str], filters: dict | None, steps: list[dict]
+    ) -> dict[str, BaseNode]:
+        """Return the nodes reached by following parallax `steps` from the
+        nodes with the given IDs.
+
+        `filters` restricts the initial nodes like in get_nodes_by_ids.
+        Each step is a dict with lists of relation types to follow in the
+        "outgoing" and "incoming" direction (a direction with no types is
+        skipped) and optional "filters" restricting the nodes reached, like
+        in get_nodes_neighbors.
+
+        All steps are compiled into a single statement, so intermediate
+        node sets stay in the database. Return a map of IDs (id::...) to
+        the nodes of the last step.
         """
-        result = self._run(query_text, node_ids=node_ids)
+        raw_db_ids = list(self.ids_to_raw_db_ids(ids).values())
+        label_filters = filters.get('labels', None) if filters else None
+        property_filters = filters.get('properties', None) if filters else None
+
+        query = "MATCH (n) WHERE elementid(n) IN $raw_db_ids "
+        if label_filters:
+            query += """
+            AND any(label IN $label_filters
+                    WHERE label in labels(n))
+            """
+        if property_filters:
+            query += """
+            AND all(pname IN keys($property_filters)
+            WHERE toLower(n[pname]) CONTAINS toLower($property_filters[pname]))
+            """
+
+        step_params = []
+        for i, step in enumerate(steps):
+            step_filters = step.get("filters") or {}
+            step_params.append({
+                "outgoing": step.get("outgoing") or [],
+                "incoming": step.get("incoming") or [],
+                "labels": step_filters.get("labels") or [],
+                "properties": step_filters.get("properties") or {},
+            })
+            # only the shape of the query depends on the steps, their
+            # values are passed as parameters.
+            branches = []
+            if step_params[i]["outgoing"]:
+                branches.append(
+                    f"MATCH (n)-[r]->(m) WHERE type(r) IN $steps[{i}].outgoing RETURN m"
+                )
+            if step_params[i]["incoming"]:
+                branches.append(
+                    f"MATCH (n)<-[r]-(m) WHERE type(r) IN $steps[{i}].incoming RETURN m"
+                )
+            if not branches:
+                return {}
+            query += (
+                "\nCALL (n) {\n    "
+                + "\n    UNION\n    ".join(branches)
+                + "\n}\nWITH DISTINCT m AS n WHERE true "
+            )
+            if step_params[i]["labels"]:
+                query += f"""
+                AND any(label IN $steps[{i}].labels WHERE label IN labels(n))
+                """
+            if step_params[i]["properties"]:
+                query += f"""
+                AND all(pname IN keys($steps[{i}].properties)
+                        WHERE n[pname] CONTAINS $steps[{i}].properties[pname])
+                """
+        query += "\nRETURN n, elementid(n) AS nid"
+
+        result = self._run(
+            query,
+            raw_db_ids=raw_db_ids,
+            label_filters=label_filters,
+            property_filters=property_filters,
+            steps=step_params,
+        )
         return {
-            row['rel_type']: row['num_neighbors']
+            f"id::{row['nid']}": BaseNode.from_neo_node(row["n"])
             for row in result
         }
 
-    def outgoing_relation_types(self, node_ids):
+    def get_nodes_summary(self, node_ids: list[str]) -> dict:
+        """Describe the nodes with the given raw database IDs.
+
+        Return a dict with the number of relations per type of incoming
+        ("incoming") and outgoing ("outgoing") relations, and the sorted
+        labels ("labels") and property names ("properties") of the nodes.
+        Everything is computed by a single statement.
+        """
         query_text = """
-        MATCH (a)-[r]->(b)
-        WHERE elementid(a) IN $node_ids
-        RETURN type(r) AS rel_type, count(b) AS num_neighbors
+        MATCH (n) WHERE elementid(n) IN $node_ids
+        WITH collect(n) AS nodes
+        CALL (nodes) {
+            UNWIND nodes AS n
+            MATCH (n)<-[r]-()
+            WITH type(r) AS rel_type, count(*) AS num_neighbors
+            RETURN collect([rel_type, num_neighbors]) AS incoming
+        }
+        CALL (nodes) {
+            UNWIND nodes AS n
+            MATCH (n)-[r]->()
+            WITH type(r) AS rel_type, count(*) AS num_neighbors
+            RETURN collect([rel_type, num_neighbors]) AS outgoing
+        }
+        CALL (nodes) {
+            UNWIND nodes AS n
+            UNWIND labels(n) AS label
+            RETURN collect(DISTINCT label) AS labels
+        }
+        CALL (nodes) {
+            UNWIND nodes AS n
+            UNWIND keys(n) AS key
+            RETURN collect(DISTINCT key) AS properties
+        }
+        RETURN incoming, outgoing, labels, properties
         """
-        result = self._run(query_text, node_ids=node_ids)
+        row = self._run(query_text, node_ids=node_ids).single()
         return {
-            row['rel_type']: row['num_neighbors']
-            for row in result
+            "incoming": dict(row["incoming"]),
+            "outgoing": dict(row["outgoing"]),
+            "labels": sorted(row["labels"]),
+            "properties": sorted(prop for prop in row["properties"] if prop),
         }
 
+    def _count_elements(self, entity_type: str) -> int:
+        """Return the number of nodes ("NODE") or relations ("RELATIONSHIP").
+        Both are answered by Neo4j's count store without scanning."""
+        if entity_type == "NODE":
+            query = "MATCH (n) RETURN count(n) AS c"
+        else:
+            query = "MATCH ()-[r]->() RETURN count(r) AS c"
+        return self._run(query).single()["c"]
+
+    def _search_indexes(
+            self, entity_type: str, labels_or_types: list[str] | None = None
+    ) -> list[tuple[str, str, str]]:
+        """Return (label or type, property, index type) of TEXT and RANGE
+        indexes usable for searching nodes or relations.
+
+        Like a scan, we ignore properties starting with "_". If
+        labels_or_types is given, only indexes of those are returned.
+        """
+        return [
+            (label_or_type, prop, index_type)
+            for index_entity_type, label_or_type, prop, index_type
+            in g.conn.search_indexes()
+            if index_entity_type == entity_type
+            and not prop.startswith("_")
+            and (not labels_or_types or label_or_type in labels_or_types)
+        ]
+
+    # don't need a return after abort_with_json
+    # pylint: disable=inconsistent-return-statements
+    def _search_strategy(
+            self, entity_type: str, text: str, has_fulltext_index: bool,
+            labels_or_types: list[str] | None = None
+    ) -> str:
+        """Return the cheapest way of searching nodes ("NODE") or relations
+        ("RELATIONSHIP") for text.
+
+        - SEARCH_FULLTEXT if the fulltext index exists.
+        - SEARCH_SCAN if there are at most config.search_scan_max_elements
+          nodes/relations or only labels are given. This looks at all
+          properties.
+        - SEARCH_ID if text is an element ID.
+        - SEARCH_INDEX if TEXT or RANGE indexes exist. This only looks at
+          indexed properties and is case sensitive.
+
+        Otherwise abort, scanning would take too long.
+        """
+        if has_fulltext_index and text:
+            return SEARCH_FULLTEXT
+        if not text and labels_or_types:
+            # only filters by labels, which uses the token lookup index.
+            return SEARCH_SCAN
+        num_elements = self._count_elements(entity_type)
+        if num_elements <= config.search_scan_max_elements:
+            return SEARCH_SCAN
+        if text and ELEMENT_ID_PATTERN.match(text):
+            return SEARCH_ID
+        if text and self._search_indexes(entity_type, labels_or_types):
+            return SEARCH_INDEX
+        kind = "nodes" if entity_type == "NODE" else "relations"
+        abort_with_json(
+            400,
+            f"Can't search {num_elements} {kind} without an index. Create a "
+            f"fulltext index or TEXT/RANGE indexes, or raise "
+            f"GUI_SEARCH_SCAN_MAX_ELEMENTS "
+            f"(currently {config.search_scan_max_elements}).",
+            always_send_message=True,
+        )
+
+    def _index_search_query_str(
+            self, entity_type: str, labels_or_types: list[str] | None = None
+    ) -> str:
+        """Return a CALL subquery binding nodes (n) or relations (r) whose
+        indexed properties match $text.
+
+        TEXT indexes are searched with CONTAINS, RANGE indexes with STARTS
+        WITH. Names of labels, types and properties come from the schema,
+        so the query text only changes with it.
+        """
+        branches = []
+        for label_or_type, prop, index_type in self._search_indexes(
+                entity_type, labels_or_types
+        ):
+            operator = "CONTAINS" if index_type == "TEXT" else "STARTS WITH"
+            if entity_type == "NODE":
+                branches.append(
+                    f"MATCH (n:{quote_identifier(label_or_type)}) "
+                    f"WHERE n.{quote_identifier(prop)} {operator} $text RETURN n"
+                )
+            else:
+                branches.append(
+                    f"MATCH ()-[r:{quote_identifier(label_or_type)}]->() "
+                    f"WHERE r.{quote_identifier(prop)} {operator} $text RETURN r"
+                )
+        return "CALL () {\n    " + "\n    UNION\n    ".join(branches) + "\n}\n"
+
     def _property_search_query_str(self, var_name:str="n"):
         """Helper method for building a property filtering string for nodes and relations.
         """
@@ -776,34 +1082,67 @@ class CypherDatabase(GraphDatabase):
             OR toLower(elementid({var_name})) CONTAINS toLower($text)))
         """
 
-    def _query_nodes_with_nft(self, text: str, labels: list[str]) -> dict[str, BaseNode]:
+    def _query_nodes_with_nft(
+            self, text: str, labels: list[str], limit: int | None, skip: int
+    ) -> NodeSearchResult:
         labels_filter_expr = """
-        any(lab IN $labels WHERE lab IN labels(n))
+        AND any(lab IN $labels WHERE lab IN labels(n))
         """ if labels else ""
 
+        # If we allow any score, some things become confusing to the user. For
+        # example searching for an ID returns every node/relation in the graph,
+        # since a big portion of Neo4j's element IDs are equal.
+        # Hits are ordered by score, so we only need to collect them (as
+        # references, the nodes are only sent for the requested page).
         query = f"""
-        CALL db.index.fulltext.queryNodes("nft", $text, {{limit: {FT_SEARCH_MAX_RESULTS}}})
+        CALL db.index.fulltext.queryNodes("nft", $text, {{limit: $max_results}})
         YIELD node AS n, score
+        WITH count(*) AS num_hits,
+             collect(CASE WHEN score > $min_score {labels_filter_expr} THEN n END) AS hits
+        RETURN hits[$skip..$skip + coalesce($limit, size(hits))] AS nodes,
+               size(hits) AS total,
+               num_hits >= $max_results AS estimated
         """
         # Escape colon, otherwise searching for an element ID results in a crash.
         # We don't need to support the whole lucene syntax.
         text = f"{text.replace(':', r'\:')}"
-        if labels_filter_expr:
-            query += f"WHERE {labels_filter_expr} "
-        query += "RETURN n, elementid(n) AS nid, score"
-        result = self._run(query, text=text, labels=labels)
-        # If we allow any score, some things become confusing to the user. For
-        # example searching for an ID returns every node/relation in the graph,
-        # since a big portion of Neo4j's element IDs are equal.
-        nodes = {
-            row['nid']: BaseNode.from_neo_node(row["n"])
-            for row in result
-            if row['score'] > FT_QUERY_MIN_SCORE
-        }
-        return nodes
+        row = self._run(
+            query,
+            text=text,
+            labels=labels,
+            max_results=FT_SEARCH_MAX_RESULTS,
+            min_score=FT_QUERY_MIN_SCORE,
+            skip=skip,
+            limit=limit,
+        ).single()
+        return NodeSearchResult(
+            nodes=[BaseNode.from_neo_node(n) for n in row["nodes"]],
+            total=row["total"],
+            estimated=row["estimated"],
+        )
+
 
+    def _query_nodes_page(self, query: str, limit: int | None, skip: int,
+                          **params) -> NodeSearchResult:
+        """Run a search query binding matching nodes to n and return the
+        requested page of them."""
+        # without a score, order by ID to get stable pages.
+        query += """
+        WITH DISTINCT n ORDER BY elementid(n)
+        WITH collect(n) AS hits
+        RETURN hits[$skip..$skip + coalesce($limit, size(hits))] AS nodes,
+               size(hits) AS total
+        """
+        row = self._run(query, skip=skip, limit=limit, **params).single()
+        return NodeSearchResult(
+            nodes=[BaseNode.from_neo_node(n) for n in row["nodes"]],
+            total=row["total"],
+            estimated=False,
+        )
 
-    def _query_nodes_scan_props(self, text: str, labels: list[str]) -> dict[str, BaseNode]:
+    def _query_nodes_scan_props(
+            self, text: str, labels: list[str], limit: int | None, skip: int
+    ) -> NodeSearchResult:
 
         if labels:
             query = "MATCH (n:$any($labels)) "
@@ -813,21 +1152,37 @@ class CypherDatabase(GraphDatabase):
         if text:
             query += self._property_search_query_str('n')
 
-        query += "RETURN n, elementid(n) AS nid"
+        return self._query_nodes_page(query, limit, skip, text=text, labels=labels)
 
-        result = self._run(query, text=text, labels=labels)
-        nodes = {
-            row['nid']: BaseNode.from_neo_node(row["n"])
-            for row in result
-        }
-        return nodes
+    def _query_nodes_by_id(
+            self, text: str, labels: list[str], limit: int | None, skip: int
+    ) -> NodeSearchResult:
+        query = "MATCH (n) WHERE elementid(n) = $text "
+        if labels:
+            query += "AND any(lab IN $labels WHERE lab IN labels(n)) "
+        return self._query_nodes_page(query, limit, skip, text=text, labels=labels)
+
+    def _query_nodes_with_indexes(
+            self, text: str, labels: list[str], limit: int | None, skip: int
+    ) -> NodeSearchResult:
+        # indexes are restricted to the labels, so no need to filter them.
+        query = self._index_search_query_str("NODE", labels)
+        return self._query_nodes_page(query, limit, skip, text=text)
 
 
-    def query_nodes(self, text: str, labels: list[str], pseudo: bool) -> list[BaseNode]:
+    def query_nodes(
+            self, text: str, labels: list[str], pseudo: bool,
+            limit: int | None = None, skip: int = 0
+    ) -> NodeSearchResult:
         """Return nodes which contain text and labels.
 
         If the database has _ft__tech_ support, use it. Otherwise search
-        across all properties of all nodes
+        across all properties of all nodes, or use other indexes if there
+        are too many nodes (see _search_strategy).
+
+        Only `limit` nodes (all if None) after skipping the first `skip`
+        ones are returned, together with the total number of hits.
+        Fulltext hits are ordered by score.
         """
 
         # pylint: disable=unused-argument
@@ -840,7 +1195,8 @@ class CypherDatabase(GraphDatabase):
         # We only execute an nft search when text is provided. Otherwise we
         # still allow empty queries to return everything and filter them with
         # labels.
-        if g.conn.has_nft_index() and text:
+        strategy = self._search_strategy("NODE", text, g.conn.has_nft_index(), labels)
+        if strategy == SEARCH_FULLTEXT:
             # For simple queries (e.g. without boolean operators) we want to
             # have the same search results, regardless of the database having
             # nft or not. So we append an wildcard to text.  Unfortunately
@@ -850,10 +1206,12 @@ class CypherDatabase(GraphDatabase):
             # even though the ID is in the database and in the _ft__tech_
             # property.  So we do two queries, one with and one without wildcard.
 
-            nodes = self._query_nodes_with_nft(text, labels)
-        else:
-            nodes = self._query_nodes_scan_props(text, labels)
-        return list(nodes.values())
+            return self._query_nodes_with_nft(text, labels, limit, skip)
+        if strategy == SEARCH_ID:
+            return self._query_nodes_by_id(text, labels, limit, skip)
+        if strategy == SEARCH_INDEX:
+            return self._query_nodes_with_indexes(text, labels, limit, skip)
+        return self._query_nodes_scan_props(text, labels, limit, skip)
 
     # ======================= Relation related ================================
 
@@ -920,6 +1278,54 @@ class CypherDatabase(GraphDatabase):
             )
             return None
 
+        updated_relations = self._update_relations(
+            [self._relation_update_row(existing_relation, relation_data)]
+        )
+        if not updated_relations:
+            current_app.logger.debug("No matching relations.")
+            return None
+        return updated_relations[existing_relation.element_id]
+
+    def update_relations(
+            self,
+            relation_data_map: dict[str, dict],
+            existing_relations: dict[str, BaseRelation] | None = None
+    ) -> dict[str, BaseRelation]:
+        """Update multiple relations at once.
+
+        `relation_data_map` maps relation IDs to partial relation data, see
+        update_relation_by_id. `existing_relations` maps the same IDs to
+        the relations in their current state. If not given, they are
+        fetched.
+
+        Return a map of the given IDs to the updated relations. Relations
+        whose type changed are new relations, so they have a different
+        ID. IDs of relations not existing in the database are left out.
+        """
+        if existing_relations is None:
+            existing_relations = self.get_relations_by_ids(
+                list(relation_data_map.keys())
+            )
+
+        rows = []
+        raw_db_id_to_input_id = {}
+        for rid, relation_data in relation_data_map.items():
+            existing_relation = existing_relations.get(rid)
+            if not existing_relation:
+                continue
+            rows.append(self._relation_update_row(existing_relation, relation_data))
+            raw_db_id_to_input_id[existing_relation.element_id] = rid
+
+        return {
+            raw_db_id_to_input_id[raw_db_id]: relation
+            for raw_db_id, relation in self._update_relations(rows).items()
+        }
+
+    def _relation_update_row(
+            self, existing_relation: BaseRelation, relation_data: dict
+    ) -> dict:
+        """Return the changes `relation_data` makes to `existing_relation`,
+        as expected by _update_relations."""
         if "properties" in relation_data:
             # collect new properties with corresponding base IDS and keep
             # mandatory ones from the existing relation
@@ -927,43 +1333,62 @@ class CypherDatabase(GraphDatabase):
                 existing_relation.properties, relation_data["properties"]
             )
         else:
-            properties = existing_relation.properties
+            # the driver only sends dicts, properties may be read-only
+            # views (see BaseRelation.from_neo_relation).
+            properties = dict(existing_relation.properties)
 
+        new_type = None
         if (
             "type" in relation_data
             and relation_data["type"] != existing_relation.type
         ):
             new_type = relation_data["type"].split(":")[-1]
-            result = self._run(
-                """
-                MATCH (n)-[r]->(m) WHERE elementid(r)=$rid
-                CALL apoc.create.relationship(n, $new_type, $properties, m)
-                YIELD rel AS r2
-                DELETE r
-                RETURN r2 AS r
-            """,
-                new_type=new_type,
-                rid=raw_db_id,
-                properties=properties,
-            )
-        else:
-            result = self._run(
-                """MATCH ()-[r]->() WHERE elementid(r)=$rid
-                   SET r=$properties
-                   RETURN r""",
-                rid=raw_db_id,
-                properties=properties,
-            )
 
-        if not result:
-            current_app.logger.debug("No matching relations.")
-            return None
+        return {
+            "rid": existing_relation.element_id,
+            "properties": properties,
+            "new_type": new_type,
+        }
 
-        new_rel = result.single()["r"]
+    def _update_relations(self, rows: list[dict]) -> dict[str, BaseRelation]:
+        """Apply relation changes computed by _relation_update_row.
 
-        if raw_db_id:
-            return BaseRelation.from_neo_relation(new_rel)
-        return BaseRelation.from_neo_relation(new_rel)
+        Changing the type of a relation means replacing it by a new one.
+        Property updates and type changes are applied with one statement
+        each per RELATION_UPDATE_BATCH_SIZE rows. Return a map of the
+        raw database IDs of the given relations to the updated relations.
+        """
+        property_rows = [row for row in rows if row["new_type"] is None]
+        retype_rows = [row for row in rows if row["new_type"] is not None]
+        updated_relations = {}
+        for query, query_rows in [
+                (
+                    """UNWIND $rows AS row
+                    MATCH ()-[r]->() WHERE elementid(r) = row.rid
+                    SET r = row.properties
+                    RETURN row.rid AS rid, r""",
+                    property_rows
+                ),
+                (
+                    """UNWIND $rows AS row
+                    MATCH (n)-[r]->(m) WHERE elementid(r) = row.rid
+                    CALL apoc.create.relationship(n, row.new_type, row.properties, m)
+                    YIELD rel AS r2
+                    DELETE r
+                    RETURN row.rid AS rid, r2 AS r""",
+                    retype_rows
+                ),
+        ]:
+            for start in range(0, len(query_rows), RELATION_UPDATE_BATCH_SIZE):
+                result = self._run(
+                    query,
+                    rows=query_rows[start:start + RELATION_UPDATE_BATCH_SIZE]
+                )
+                for row in result:
+                    updated_relations[row["rid"]] = BaseRelation.from_neo_relation(
+                        row["r"]
+                    )
+        return updated_relations
 
     def create_relations(self, relation_data_list: list[dict]) -> dict[str, BaseRelation]:
         """Create multiple nodes at once.
@@ -1034,31 +1459,55 @@ class CypherDatabase(GraphDatabase):
             return None
 
         result = self._run(
-            f"""MATCH ()-[r]->() WHERE elementid(r) IN {raw_db_ids}
-                CALL (r) {{
+            """MATCH ()-[r]->() WHERE elementid(r) IN $raw_db_ids
+                CALL (r) {
                   DELETE r
-                }}
-                RETURN COUNT(r) AS c"""
+                }
+                RETURN COUNT(r) AS c""",
+            raw_db_ids=raw_db_ids
         )
         return result.single()["c"]
 
     def query_relations(self, text: str) -> list[BaseRelation]:
         """Return relations which contain text.
 
-        If the database has _ft__tech_ support, use it. Otherwise query
-        across all relations, looking in property keys and values.
+        If the database has a fulltext index on relations (see
+        Neo4jConnection.create_relation_fulltext_index), use it. Otherwise
+        query across all relations, looking in property keys and values,
+        or use other indexes if there are too many relations (see
+        _search_strategy).
         """
         raw_db_id = parse_db_id(text)
         if raw_db_id:
             text = raw_db_id
-        query = "MATCH ()-[r]->() "
-        query += self._property_search_query_str('r')
-        query += f"""
-        OR toLower(type(r)) STARTS WITH toLower($text)
-        RETURN r LIMIT {FT_SEARCH_MAX_RESULTS}
-        """
+        strategy = self._search_strategy(
+            "RELATIONSHIP", text, g.conn.has_rft_index()
+        )
+        params = {}
+        if strategy == SEARCH_FULLTEXT:
+            query = """
+            CALL db.index.fulltext.queryRelationships("rft", $text, {limit: $limit})
+            YIELD relationship AS r, score
+            WHERE score > $min_score
+            RETURN r
+            """
+            # see _query_nodes_with_nft
+            text = f"{text.replace(':', r'\:')}"
+            params["min_score"] = FT_QUERY_MIN_SCORE
+        elif strategy == SEARCH_ID:
+            query = "MATCH ()-[r]->() WHERE elementid(r) = $text RETURN r"
+        elif strategy == SEARCH_INDEX:
+            query = self._index_search_query_str("RELATIONSHIP")
+            query += "RETURN r LIMIT $limit"
+        else:
+            query = "MATCH ()-[r]->() "
+            query += self._property_search_query_str('r')
+            query += """
+            OR toLower(type(r)) STARTS WITH toLower($text)
+            RETURN r LIMIT $limit
+            """
 
-        result = self._run(query, text=text)
+        result = self._run(query, text=text, limit=FT_SEARCH_MAX_RESULTS, **params)
         relations = [BaseRelation.from_neo_relation(row["r"]) for row in result]
         return relations
 
@@ -1379,6 +1828,11 @@ class CypherDatabase(GraphDatabase):
     def _get_metaobjects(self, metalabel):
         """Get all elements with the given 'metalabel' (MetaLabel, MetaProperty
         etc.)"""
+        # the label stays in the query text, so the label index can be used.
+        # Only allow our few metamodel labels to keep the number of distinct
+        # queries bounded.
+        if metalabel not in METAMODEL_LABELS:
+            raise ValueError(f"Unknown metamodel label {metalabel}")
         query = f"""MATCH (def: {metalabel})
                     RETURN def.name__tech_ AS def_name"""
         query_result = self._run(query)
@@ -1401,10 +1855,41 @@ class CypherDatabase(GraphDatabase):
         """Load metamodels and set corresponding "globals".
 
         This is needed in order to correctly build semantic ids.
+        Metamodels are served from a cache shared by all requests using the
+        same host and database (see metamodel_cache).
         """
-        self._get_metalabels()
-        self._get_metaproperties()
-        self._get_metarelations()
+        key = metamodel_cache_key(g.conn)
+        ttl = config.metamodel_cache_ttl
+        with metamodel_cache_lock:
+            version = metamodel_versions.get(key, 0)
+            entry = metamodel_cache.get(key)
+
+        if (
+            entry is not None
+            and entry["version"] == version
+            and monotonic() - entry["loaded_at"] < ttl
+        ):
+            g.modelled_labels = entry["labels"]
+            g.modelled_properties = entry["properties"]
+            g.modelled_relation_types = entry["relation_types"]
+            return
+
+        # The version is read before querying, so an entry loaded while
+        # a concurrent request changes metamodels is stale from the start.
+        entry = {
+            "version": version,
+            "loaded_at": monotonic(),
+            "labels": frozenset(self._get_metalabels()),
+            "properties": frozenset(self._get_metaproperties()),
+            "relation_types": frozenset(self._get_metarelations()),
+        }
+        g.modelled_labels = entry["labels"]
+        g.modelled_properties = entry["properties"]
+        g.modelled_relation_types = entry["relation_types"]
+        if ttl > 0:
+            with metamodel_cache_lock:
+                if metamodel_versions.get(key, 0) == version:
+                    metamodel_cache[key] = entry
 
     def get_all_labels(self, nids: list[str] | None = None) -> list[str]:
         """Return all labels available in graph.
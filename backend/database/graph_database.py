@@ -63,6 +63,15 @@ class GraphDatabase(ABC):
         """Update node with partial data."""
         pass
 
+    @abstractmethod
+    def update_nodes(
+            self,
+            node_data_map: dict[str, dict],
+            existing_nodes: dict[str, BaseNode] | None = None
+    ) -> dict[str, BaseNode]:
+        """Update multiple nodes with partial data at once."""
+        pass
+
     @abstractmethod
     def delete_nodes_by_ids(self, ids):
         """Delete multiple nodes by ids"""
@@ -109,7 +118,20 @@ class GraphDatabase(ABC):
         pass
 
     @abstractmethod
-    def get_nodes_neighbors(self, id_map, relation_types, direction, neighbors_filters=None):
+    def get_parallax_nodes(self, ids, filters, steps):
+        """Return the nodes reached by following parallax steps from the
+        nodes with the given IDs."""
+        pass
+
+    @abstractmethod
+    def get_nodes_summary(self, node_ids: list[str]) -> dict:
+        """Return relation types, labels and property names of the given
+        nodes."""
+        pass
+
+    @abstractmethod
+    def get_nodes_neighbors(self, id_map, relation_types, direction,
+                            neighbors_filters=None, incoming_relation_types=None):
         """Return all neighbors from nodes in id_map.
 
         Args:
@@ -118,6 +140,10 @@ class GraphDatabase(ABC):
 
             relation_types: List of relation types. For example: ['likes__dummy_'].
 
+            incoming_relation_types: Relation types of incoming relations
+                    if direction is "both" and they differ from
+                    relation_types.
+
         Returns:
             A dict mapping node IDs (original ones found in id_map) to
             another dict (string -> node) representing neighbors
@@ -130,8 +156,8 @@ class GraphDatabase(ABC):
         pass
 
     @abstractmethod
-    def query_nodes(self, text, labels, pseudo):
-        """Return nodes which contain text and labels.
+    def query_nodes(self, text, labels, pseudo, limit=None, skip=0):
+        """Return nodes which contain text and labels, as NodeSearchResult.
 
         If the database has _ft__tech_ support, use it. Otherwise search
         across all properties of all nodes
@@ -162,6 +188,15 @@ class GraphDatabase(ABC):
         """Replace a relation by its id from the GraphEditor relation_data."""
         pass
 
+    @abstractmethod
+    def update_relations(
+            self,
+            relation_data_map: dict[str, dict],
+            existing_relations: dict[str, BaseRelation] | None = None
+    ) -> dict[str, BaseRelation]:
+        """Update multiple relations with partial data at once."""
+        pass
+
     @abstractmethod
     def create_relations(self, relation_data_list: list[dict]) -> dict[str, BaseRelation]:
         """Create multiple nodes at once.
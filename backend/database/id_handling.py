@@ -1,10 +1,19 @@
 # This module contains functions for dealing with IDs.
 
 from enum import Enum
+from functools import lru_cache
 import re
 
 NAMESPACE_PAT = re.compile(r'_.*_$')
 
+# Semantic IDs are computed and parsed for every label, type and property
+# key of every element we map, but there are only a few hundred distinct
+# ones. So results are memoized, which also makes equal IDs share one
+# string object. We don't use sys.intern, since interned strings are never
+# freed (Python 3.12) and IDs may come from requests. Caches are bounded,
+# since they may still see IDs of many elements.
+ID_CACHE_SIZE = 8192
+
 class GraphEditorLabel(Enum):
     """An enum for all labels used by GraphEditor.
 
@@ -37,7 +46,14 @@ def get_base_id(idstr: str):
       "id::123" ==> "123"
       "foo" ==> "foo"
     """
+    if idstr.startswith("id::"):
+        # IDs of elements are hardly repeated, don't cache them.
+        return idstr[4:]
+    return _get_base_id(idstr)
 
+
+@lru_cache(maxsize=ID_CACHE_SIZE)
+def _get_base_id(idstr: str):
     parts = idstr.split("::", 1)
     if len(parts) == 2:
         return parts[-1]
@@ -58,10 +74,25 @@ def compute_semantic_id(idstr, metalabel):
     idstr='address__dummy_', metalabel=GraphEditorLabel.MetaProperty
     ==> MetaProperty::address__dummy_
     """
+    return SEMANTIC_ID_BUILDERS[metalabel](idstr)
+
 
+def _semantic_id_builder(metalabel: GraphEditorLabel):
+    """Return a memoized function computing semantic IDs of metalabel."""
     typestr = f"{metalabel.name}"
 
-    return f"{typestr}::{idstr}"
+    @lru_cache(maxsize=ID_CACHE_SIZE)
+    def semantic_id(idstr):
+        return f"{typestr}::{idstr}"
+
+    return semantic_id
+
+
+# Functions computing semantic IDs, one per metalabel. In loops, use them
+# directly instead of compute_semantic_id, which has to look them up.
+SEMANTIC_ID_BUILDERS = {
+    metalabel: _semantic_id_builder(metalabel) for metalabel in GraphEditorLabel
+}
 
 
 def semantic_id_parts(idstr):
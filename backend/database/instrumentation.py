@@ -0,0 +1,288 @@
+"""Per-request instrumentation of Cypher statements and style evaluation.
+
+Every statement run by Neo4jConnection is recorded in the request's
+RequestStats (statement count, wall time spent in the driver, rows streamed
+and the server timings of the result summaries). At the end of a request
+these numbers are sent to the client as Server-Timing header and
+aggregated per endpoint, see render_metrics.
+
+Metrics are kept per process. With several worker processes, each of them
+reports only the requests it answered.
+"""
+from threading import Lock
+from time import perf_counter
+
+import neo4j
+from flask import g, has_app_context, request
+
+# upper bounds (in seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class RequestStats:
+    """Numbers collected during a single request."""
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.statements = 0
+        self.rows = 0
+        # time spent waiting for Neo4j in the driver (client side)
+        self.db_time = 0.0
+        # sum of result_available_after and result_consumed_after, as
+        # reported by the server
+        self.server_time = 0.0
+        self.style_time = 0.0
+        self.results = []
+
+    def collect_summaries(self):
+        """Add the server timings of all results of this request.
+
+        Consumes the results, so only call this when the request is done.
+        """
+        for result in self.results:
+            try:
+                summary = result.consume()
+            except (neo4j.exceptions.Neo4jError, neo4j.exceptions.DriverError):
+                # e.g. the transaction was already closed or the
+                # statement failed.
+                continue
+            self.server_time += (
+                (summary.result_available_after or 0)
+                + (summary.result_consumed_after or 0)
+            ) / 1000
+        self.results = []
+
+    def server_timing(self, total: float) -> str:
+        """Return the value of the Server-Timing header."""
+        app_time = max(total - self.db_time - self.style_time, 0)
+        return ", ".join([
+            f'db;dur={self.db_time * 1000:.1f};desc="Neo4j '
+            f'({self.statements} statements, {self.rows} rows)"',
+            f'neo4j;dur={self.server_time * 1000:.1f};desc="Neo4j server"',
+            f'style;dur={self.style_time * 1000:.1f};desc="Style evaluation"',
+            f'app;dur={app_time * 1000:.1f};desc="Mapping and other"',
+            f"total;dur={total * 1000:.1f}",
+        ])
+
+
+def request_stats() -> RequestStats:
+    """Return the RequestStats of the current request."""
+    if "request_stats" not in g:
+        g.request_stats = RequestStats()
+    return g.request_stats
+
+
+def record_style_time(duration: float):
+    """Add 'duration' seconds of style evaluation to the current request."""
+    if has_app_context() and "request_stats" in g:
+        g.request_stats.style_time += duration
+
+
+class InstrumentedResult:
+    """Wrapper of neo4j.Result counting rows and time spent fetching them.
+
+    Only the methods we use are instrumented, everything else is passed
+    through to the wrapped result.
+    """
+
+    def __init__(self, result: neo4j.Result, stats: RequestStats):
+        self._result = result
+        self._stats = stats
+        stats.results.append(result)
+
+    def __iter__(self):
+        iterator = iter(self._result)
+        stats = self._stats
+        while True:
+            start = perf_counter()
+            try:
+                record = next(iterator)
+            except StopIteration:
+                stats.db_time += perf_counter() - start
+                return
+            stats.db_time += perf_counter() - start
+            stats.rows += 1
+            yield record
+
+    def __next__(self):
+        record = self._timed(next, self._result)
+        self._stats.rows += 1
+        return record
+
+    def _timed(self, method, *args, **kwargs):
+        start = perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            self._stats.db_time += perf_counter() - start
+
+    def single(self, *args, **kwargs):
+        record = self._timed(self._result.single, *args, **kwargs)
+        if record is not None:
+            self._stats.rows += 1
+        return record
+
+    def data(self, *keys):
+        records = self._timed(self._result.data, *keys)
+        self._stats.rows += len(records)
+        return records
+
+    def values(self, *keys):
+        records = self._timed(self._result.values, *keys)
+        self._stats.rows += len(records)
+        return records
+
+    def fetch(self, n):
+        records = self._timed(self._result.fetch, n)
+        self._stats.rows += len(records)
+        return records
+
+    def consume(self):
+        return self._timed(self._result.consume)
+
+    def __getattr__(self, name):
+        return getattr(self._result, name)
+
+
+def run_instrumented(run, statement, **params):
+    """Call 'run' (e.g. Transaction.run) and record the statement."""
+    stats = request_stats()
+    start = perf_counter()
+    try:
+        result = run(statement, **params)
+    finally:
+        stats.statements += 1
+        stats.db_time += perf_counter() - start
+    return InstrumentedResult(result, stats)
+
+
+class Histogram:
+    """Prometheus style histogram with LATENCY_BUCKETS."""
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+                break
+
+    def render(self, name: str, labels: str) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class EndpointMetrics:
+    """Aggregated RequestStats of one endpoint."""
+
+    def __init__(self):
+        self.duration = Histogram()
+        self.db_duration = Histogram()
+        self.server_time = 0.0
+        self.style_time = 0.0
+        self.statements = 0
+        self.rows = 0
+
+    def add(self, stats: RequestStats, total: float):
+        self.duration.observe(total)
+        self.db_duration.observe(stats.db_time)
+        self.server_time += stats.server_time
+        self.style_time += stats.style_time
+        self.statements += stats.statements
+        self.rows += stats.rows
+
+
+metrics_lock = Lock()
+# maps (method, url rule) to EndpointMetrics
+metrics = dict()
+
+METRIC_HELP = {
+    "grapheditor_request_duration_seconds":
+        ("histogram", "Time to answer a request."),
+    "grapheditor_neo4j_duration_seconds":
+        ("histogram", "Time a request waited for Neo4j (client side)."),
+    "grapheditor_neo4j_server_seconds_total":
+        ("counter", "Time reported by Neo4j to plan, run and stream results."),
+    "grapheditor_style_seconds_total":
+        ("counter", "Time spent evaluating style rules."),
+    "grapheditor_neo4j_statements_total":
+        ("counter", "Number of Cypher statements run."),
+    "grapheditor_neo4j_rows_total":
+        ("counter", "Number of rows streamed from Neo4j."),
+}
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_metrics() -> str:
+    """Return the metrics of all endpoints in Prometheus' text format."""
+    with metrics_lock:
+        samples = {name: [] for name in METRIC_HELP}
+        for (method, endpoint), m in sorted(metrics.items()):
+            labels = (
+                f'method="{_escape_label(method)}",'
+                f'endpoint="{_escape_label(endpoint)}"'
+            )
+            samples["grapheditor_request_duration_seconds"].extend(
+                m.duration.render("grapheditor_request_duration_seconds", labels)
+            )
+            samples["grapheditor_neo4j_duration_seconds"].extend(
+                m.db_duration.render("grapheditor_neo4j_duration_seconds", labels)
+            )
+            for name, value in (
+                    ("grapheditor_neo4j_server_seconds_total", m.server_time),
+                    ("grapheditor_style_seconds_total", m.style_time),
+                    ("grapheditor_neo4j_statements_total", m.statements),
+                    ("grapheditor_neo4j_rows_total", m.rows),
+            ):
+                samples[name].append(f"{name}{{{labels}}} {value}")
+
+    lines = []
+    for name, (metric_type, help_text) in METRIC_HELP.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.extend(samples[name])
+    return "\n".join(lines) + "\n"
+
+
+def init_app(app):
+    """Register the hooks recording requests of 'app'.
+
+    Call it before registering other before_request hooks, so their time
+    is measured too.
+    """
+
+    @app.before_request
+    def start_request_stats():
+        g.request_stats = RequestStats()
+
+    @app.after_request
+    def finish_request_stats(response):
+        stats = g.pop("request_stats", None)
+        if stats is None:
+            return response
+        stats.collect_summaries()
+        total = perf_counter() - stats.started
+        response.headers["Server-Timing"] = stats.server_timing(total)
+
+        endpoint = request.url_rule.rule if request.url_rule else "<unmatched>"
+        key = (request.method, endpoint)
+        with metrics_lock:
+            if key not in metrics:
+                metrics[key] = EndpointMetrics()
+            metrics[key].add(stats, total)
+        return response
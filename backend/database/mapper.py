@@ -3,17 +3,18 @@ GraphEditor and vice-versa
 """
 
 import copy
-from dataclasses import dataclass
 from typing import Optional
 from flask import current_app
+import msgspec
 import neo4j
 from neo4j.spatial import CartesianPoint, WGS84Point
 
 from blueprints.display.style_support import apply_style_rules
-from database.utils import abort_with_json, find_a_value
+from database.utils import abort_with_json, find_a_value, find_values
 from database.settings import config
 from database.id_handling import (
-    compute_semantic_id, get_base_id, GraphEditorLabel, semantic_id_parts
+    compute_semantic_id, get_base_id, GraphEditorLabel, semantic_id_parts,
+    SEMANTIC_ID_BUILDERS
 )
 from database.base_types import BaseNode, BaseRelation, BaseElement
 
@@ -72,21 +73,53 @@ METALABELS = {e.name for e in GraphEditorLabel}
 # all tech labels
 TECH_LABELS = METALABELS.union({"___tech_"})
 
+# semantic IDs of every label, type and property key of elements, see
+# id_handling.SEMANTIC_ID_BUILDERS
+_label_semantic_id = SEMANTIC_ID_BUILDERS[GraphEditorLabel.MetaLabel]
+_relation_semantic_id = SEMANTIC_ID_BUILDERS[GraphEditorLabel.MetaRelation]
+_property_semantic_id = SEMANTIC_ID_BUILDERS[GraphEditorLabel.MetaProperty]
+
+# Views of nodes and relations in responses. Compact views leave out the
+# expensive parts (see COMPACT_OMITTED_FIELDS), the long description is
+# available through a dedicated endpoint.
+VIEW_FULL = "full"
+VIEW_COMPACT = "compact"
+VIEWS = [VIEW_FULL, VIEW_COMPACT]
+COMPACT_OMITTED_FIELDS = {"longDescription", "style", "properties"}
+
+DESCRIPTION_KEYS = (
+    "_description",
+    "description",
+    "displayDescription",
+    "description__tech_",
+)
+LONG_DESCRIPTION_KEYS = (
+    "_longDescription",
+    "longDescription",
+    "long_description",
+    "long_description__tech_",
+)
+DEFAULT_DESCRIPTION = "...description..."
+DEFAULT_LONG_DESCRIPTION = "...longDescription..."
 
-@dataclass
-class GraphEditorElement():
+
+# The API types are msgspec structs, so responses with many of them can be
+# encoded to JSON directly (see utils.msgspec_response) instead of being
+# dumped by marshmallow first. Their fields correspond to NodeSchema and
+# RelationSchema.
+class GraphEditorElement(msgspec.Struct, kw_only=True):
     id: str
-    properties: dict
+    # None in compact views (see element_view)
+    properties: Optional[dict]
 
-# dataclasses representing API may have many attributes.
+# structs representing API may have many attributes.
 # our API uses pascalCase.
 # pylint: disable=too-many-instance-attributes
 # pylint: disable=invalid-name
-@dataclass
-class GraphEditorNode(GraphEditorElement):
+class GraphEditorNode(GraphEditorElement, kw_only=True):
     labels: list
     description: str
-    longDescription: str
+    longDescription: Optional[str]
     title: str
     style: Optional[dict] = None
     semanticId: Optional[str] = None
@@ -94,23 +127,25 @@ class GraphEditorNode(GraphEditorElement):
     _grapheditor_type: str = "node" # TODO remove this from datatype
 
     @classmethod
-    def from_base_node(cls, base_node: BaseNode):
-        # base_node may contain style information like x, y position
-        # from perspectives.
-        prev_style = copy.copy(base_node.style)
-        apply_style_rules(base_node)
-        base_node.style.update(prev_style)
-        grapheditor_dict = neoproperties2grapheditor(base_node)
-        title = get_node_title(base_node)
+    def from_base_node(cls, base_node: BaseNode, view: str = VIEW_FULL):
+        """Convert base_node. If view is VIEW_COMPACT, style rules, properties
+        and long description are skipped, see element_view."""
+        if view == VIEW_COMPACT:
+            grapheditor_dict = compact_grapheditor_dict(base_node)
+        else:
+            # base_node may contain style information like x, y position
+            # from perspectives.
+            prev_style = copy.copy(base_node.style)
+            apply_style_rules(base_node)
+            base_node.style.update(prev_style)
+            grapheditor_dict = neoproperties2grapheditor(base_node)
+        title = grapheditor_dict["title"]
         sem_id = get_semantic_id_from_neonode(base_node)
         grapheditor_node = GraphEditorNode(
             id = f"id::{base_node.element_id}",
             dbId=f"id::{base_node.element_id}",
             semanticId=sem_id,
-            labels=[
-                compute_semantic_id(label, metalabel=GraphEditorLabel.MetaLabel)
-                for label in base_node.labels
-            ],
+            labels=[_label_semantic_id(label) for label in base_node.labels],
             title=title,
             _grapheditor_type='node',
             properties=grapheditor_dict["properties"],
@@ -153,13 +188,12 @@ class GraphEditorNode(GraphEditorElement):
         )
 
 
-@dataclass
-class GraphEditorRelation(GraphEditorElement):
+class GraphEditorRelation(GraphEditorElement, kw_only=True):
     type: str
     source_id: str
     target_id: str
     description: str
-    longDescription: str
+    longDescription: Optional[str]
     title: str
     style: Optional[dict] = None
     semanticId: Optional[str] = None
@@ -167,17 +201,26 @@ class GraphEditorRelation(GraphEditorElement):
     _grapheditor_type: str = "relation" # TODO remove this from datatype
 
     @classmethod
-    def from_base_relation(cls, base_relation: BaseRelation, semantic_id: str | None = None):
-        # base_relation may contain style information like x, y position
-        # from perspectives.
-        prev_style = copy.copy(base_relation.style)
-        apply_style_rules(base_relation)
-        base_relation.style.update(prev_style)
-        title = get_relation_title(base_relation)
-        grapheditor_dict = neoproperties2grapheditor(base_relation, semantic_id)
-        source_id = f"id::{base_relation.source.element_id}"
-        target_id = f"id::{base_relation.target.element_id}"
-        grapheditor_dict = neoproperties2grapheditor(base_relation, semantic_id=semantic_id)
+    def from_base_relation(
+            cls, base_relation: BaseRelation, semantic_id: str | None = None,
+            view: str = VIEW_FULL
+    ):
+        """Convert base_relation. If view is VIEW_COMPACT, style rules,
+        properties and long description are skipped, see element_view."""
+        if view == VIEW_COMPACT:
+            grapheditor_dict = compact_grapheditor_dict(base_relation)
+        else:
+            # base_relation may contain style information like x, y position
+            # from perspectives.
+            prev_style = copy.copy(base_relation.style)
+            apply_style_rules(base_relation)
+            base_relation.style.update(prev_style)
+            grapheditor_dict = neoproperties2grapheditor(
+                base_relation, semantic_id=semantic_id
+            )
+        title = grapheditor_dict["title"]
+        source_id = f"id::{base_relation.source_id}"
+        target_id = f"id::{base_relation.target_id}"
         grapheditor_rel = GraphEditorRelation(
             id=(
                 semantic_id
@@ -189,9 +232,7 @@ class GraphEditorRelation(GraphEditorElement):
             title=title,
             source_id=source_id,
             target_id=target_id,
-            type=compute_semantic_id(
-                base_relation.type, metalabel=GraphEditorLabel.MetaRelation
-            ),
+            type=_relation_semantic_id(base_relation.type),
             properties=grapheditor_dict["properties"],
             description=grapheditor_dict["description"],
             longDescription=grapheditor_dict["longDescription"],
@@ -221,8 +262,10 @@ class GraphEditorRelation(GraphEditorElement):
 
 def get_node_title(node: BaseNode):
     """Determine the title of a node by trying keys. Defaults to label: id"""
+    return _node_title(node, find_a_value(node, keys=config.node_title_keys))
+
 
-    title = find_a_value(node, keys=config.node_title_keys)
+def _node_title(node: BaseNode, title):
     if title:
         return title
 
@@ -238,14 +281,44 @@ def get_node_title(node: BaseNode):
 
 def get_relation_title(relation):
     """Determine the title of a relation by trying keys. Defaults to type"""
+    return _relation_title(
+        relation, find_a_value(relation, keys=config.relation_title_keys)
+    )
+
 
-    title = find_a_value(relation, keys=config.relation_title_keys)
+def _relation_title(relation, title):
     if title:
         return title
 
     return f"{relation.type}"
 
 
+def find_display_values(obj: BaseElement) -> list:
+    """Return title, description and long description of obj.
+
+    Same as get_node_title/get_relation_title and looking up
+    DESCRIPTION_KEYS and LONG_DESCRIPTION_KEYS one by one, but with a
+    single pass over the properties. Title and description are converted
+    to strings, the long description is DEFAULT_LONG_DESCRIPTION if obj
+    has none.
+    """
+    if isinstance(obj, BaseNode):
+        title_keys = tuple(config.node_title_keys)
+    else:
+        title_keys = tuple(config.relation_title_keys)
+    title, description, long_desc = find_values(
+        obj,
+        (title_keys, DESCRIPTION_KEYS, LONG_DESCRIPTION_KEYS),
+        (None, DEFAULT_DESCRIPTION, DEFAULT_LONG_DESCRIPTION),
+    )
+    if isinstance(obj, BaseNode):
+        title = _node_title(obj, title)
+    else:
+        title = _relation_title(obj, title)
+    # properties may have any type, but the API sends strings.
+    return [str(title), str(description), long_desc]
+
+
 # pylint: disable=too-many-branches
 # single dispatch on type, so complexity is not high.
 def neoobject2grapheditor(obj):
@@ -444,27 +517,78 @@ def grapheditorproperty2neo(obj: dict):
     return val
 
 
-def neoproperties2grapheditor(obj: BaseElement, semantic_id: str|None=None) -> dict:
-    """Extract properties and attributes from a neo4j object.
-    Return a dictionary containing properties and description-related
-    attributes."""
-    description = find_a_value(
-        obj,
-        keys=["_description",
-              "description",
-              "displayDescription",
-              "description__tech_"],
-        default="...description...",
+def element_view(element: GraphEditorElement, view: str):
+    """Return element as it is sent in the given view.
+
+    Compact views are dictionaries without COMPACT_OMITTED_FIELDS, so the
+    response schemas leave them out.
+    """
+    if view != VIEW_COMPACT:
+        return element
+    return {
+        k: v for k, v in msgspec.structs.asdict(element).items()
+        if k not in COMPACT_OMITTED_FIELDS
+    }
+
+
+def compact_grapheditor_dict(obj: BaseElement) -> dict:
+    """Counterpart of neoproperties2grapheditor for compact views: only
+    title and description are computed."""
+    title, description, _ = find_display_values(obj)
+    return dict(
+        title=title,
+        description=description,
+        longDescription=None,
+        properties=None,
     )
-    default_long_description = "...longDescription..."
+
+
+def long_description(obj: BaseElement, semantic_id: str|None=None) -> str:
+    """Return the long description of obj.
+
+    If obj has no long description property, build a HTML table of its
+    properties.
+    """
     long_desc = find_a_value(
         obj,
-        keys=["_longDescription",
-              "longDescription",
-              "long_description",
-              "long_description__tech_"],
-        default=default_long_description,
+        keys=LONG_DESCRIPTION_KEYS,
+        default=DEFAULT_LONG_DESCRIPTION,
     )
+    return _long_description(obj, long_desc, semantic_id)
+
+
+def _long_description(obj: BaseElement, long_desc,
+                      semantic_id: str|None=None) -> str:
+    if long_desc != DEFAULT_LONG_DESCRIPTION:
+        return str(long_desc)
+
+    long_desc = "<table>"
+    obj_id = semantic_id if semantic_id else "id::" + obj.element_id
+
+    if isinstance(obj, BaseNode):
+        long_desc += f"<tr><th>Node</th><td>{obj_id}</td></tr>\n"
+        long_desc += f"""<tr>
+                           <th>Labels</th>
+                           <td>{', '.join(sorted(obj.labels))}</td>
+                         </tr>\n"""
+        long_desc += "<tr><th colspan=2>&nbsp;</th></tr>\n"
+    elif isinstance(obj, neo4j.graph.Relationship):
+        long_desc += f"<tr><th>Relation</th><td>{obj_id}</td></tr>\n"
+        long_desc += f"<tr><th>Type</th><td>{obj.type}</td></tr>\n"
+        long_desc += "<tr><th colspan=2>&nbsp;</th></tr>\n"
+
+    for key, value in sorted(obj.properties.items()):
+        long_desc += f"<tr><th>{key}</th><td> {value}</td></tr>\n"
+
+    long_desc += "</table>"
+    return long_desc
+
+
+def neoproperties2grapheditor(obj: BaseElement, semantic_id: str|None=None) -> dict:
+    """Extract properties and attributes from a neo4j object.
+    Return a dictionary containing properties and description-related
+    attributes."""
+    title, description, long_desc = find_display_values(obj)
 
     properties = {}
 
@@ -472,10 +596,7 @@ def neoproperties2grapheditor(obj: BaseElement, semantic_id: str|None=None) -> d
         if key == "_ft__tech_":
             # we don't pass _ft__tech_ to the frontend
             continue
-        prop_id: str = compute_semantic_id(
-            key,
-            metalabel=GraphEditorLabel.MetaProperty
-        )
+        prop_id: str = _property_semantic_id(key)
         py_val = neoobject2grapheditor(value)
         # Properties can't be a node or relation, so we ignore that case.
         # If the property is a dictionary, it already contains a 'type',
@@ -503,30 +624,10 @@ def neoproperties2grapheditor(obj: BaseElement, semantic_id: str|None=None) -> d
             new_properties[key] = properties[key]
     properties = new_properties
 
-    if long_desc == default_long_description:
-        long_desc = "<table>"
-        obj_id = semantic_id if semantic_id else "id::" + obj.element_id
-
-        if isinstance(obj, BaseNode):
-            long_desc += f"<tr><th>Node</th><td>{obj_id}</td></tr>\n"
-            long_desc += f"""<tr>
-                               <th>Labels</th>
-                               <td>{', '.join(sorted(obj.labels))}</td>
-                             </tr>\n"""
-            long_desc += "<tr><th colspan=2>&nbsp;</th></tr>\n"
-        elif isinstance(obj, neo4j.graph.Relationship):
-            long_desc += f"<tr><th>Relation</th><td>{obj_id}</td></tr>\n"
-            long_desc += f"<tr><th>Type</th><td>{obj.type}</td></tr>\n"
-            long_desc += "<tr><th colspan=2>&nbsp;</th></tr>\n"
-
-        for key, value in sorted(obj.properties.items()):
-            long_desc += f"<tr><th>{key}</th><td> {value}</td></tr>\n"
-
-        long_desc += "</table>"
-
     grapheditor_dict = dict(
+        title=title,
         description=description,
-        longDescription=long_desc,
+        longDescription=_long_description(obj, long_desc, semantic_id),
         properties=properties,
     )
     return grapheditor_dict
@@ -1,22 +1,248 @@
-from time import sleep
+from collections import defaultdict, OrderedDict
+from functools import wraps
+from time import monotonic, sleep
 from threading import Lock
 import neo4j
-from flask import current_app, g, request, session
+from flask import current_app, g, request, session, has_request_context
 
 from blueprints.display.style_support import select_style, get_selected_style
 from database.auth import ensure_valid_token
+from database.instrumentation import run_instrumented
 from database.settings import config
-from database.utils import abort_with_json, split_statements
+from database.utils import abort_with_json, quote_identifier, split_statements
 
 MAX_RETRIES = 3
 SLEEP_DURATION = 1
-drivers_lock = Lock()
+# Waiting longer than this (in seconds) for a connection from the pool is
+# logged as warning.
+SLOW_ACQUISITION_DURATION = 0.5
 db_versions_lock = Lock()
 
 connections = dict()
-drivers = dict()
 db_versions = dict()
 
+# Results of capability probes (has_nft_index, has_uuids etc.) per
+# (host, database). Maps a key to a dict of probe names to (value, timestamp).
+capabilities_lock = Lock()
+capabilities = dict()
+
+# Number of threads waiting for a connection, per driver.
+pool_waiters_lock = Lock()
+pool_waiters = defaultdict(int)
+
+READ = neo4j.READ_ACCESS
+WRITE = neo4j.WRITE_ACCESS
+
+
+def access_mode(mode):
+    """Decorator declaring the access mode (READ or WRITE) of a view method.
+
+    Views without a declaration are considered READ for GET and HEAD
+    requests and WRITE otherwise (see request_access_mode). Use it for
+    requests that don't follow this rule, e.g. a POST only fetching data.
+    """
+
+    def decorator(f):
+        f.access_mode = mode
+        return f
+
+    return decorator
+
+
+def request_access_mode():
+    """Return the access mode (READ or WRITE) needed by the current request.
+
+    Read requests use read sessions, which a Neo4j cluster can route to
+    followers and read replicas.
+    """
+    if not has_request_context():
+        return WRITE
+    view_func = current_app.view_functions.get(request.endpoint)
+    view_class = getattr(view_func, "view_class", None)
+    method = getattr(view_class, request.method.lower(), None)
+    mode = getattr(method, "access_mode", None)
+    if mode:
+        return mode
+    return READ if request.method in ("GET", "HEAD") else WRITE
+
+
+def driver_in_use(driver: neo4j.Driver) -> bool:
+    """Return whether any connection of the pool of `driver` is in use."""
+    # The driver has no public API for this.
+    # pylint: disable=protected-access
+    pool = driver._pool
+    with pool.lock:
+        return any(
+            connection.in_use
+            for connections in pool.connections.values()
+            for connection in connections
+        )
+
+
+class DriverRegistry:
+    """Bounded cache of Neo4j drivers.
+
+    Setting up a driver is expensive, so they are reused. Each driver has its
+    own connection pool though, so we can't keep them forever. A driver is
+    evicted when it wasn't used for `idle_timeout` seconds, or when the
+    registry holds more than `max_size` drivers (least recently used first).
+    Evicted drivers are closed as soon as none of their connections is in use
+    anymore.
+    """
+
+    def __init__(self, max_size: int, idle_timeout: float):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._lock = Lock()
+        # key -> (driver, time of last use), least recently used first
+        self._drivers = OrderedDict()
+        # evicted drivers not closed yet
+        self._retired = []
+
+    def __len__(self):
+        with self._lock:
+            return len(self._drivers)
+
+    @property
+    def retired_count(self):
+        with self._lock:
+            return len(self._retired)
+
+    def items(self) -> list[tuple]:
+        """Return a list of (key, driver) pairs."""
+        with self._lock:
+            return [(key, entry[0]) for key, entry in self._drivers.items()]
+
+    def get_or_create(self, key, create) -> neo4j.Driver:
+        """Return the driver stored under `key`.
+
+        If there is none, call `create()` and store its result.
+        """
+        with self._lock:
+            now = monotonic()
+            if key in self._drivers:
+                driver = self._drivers[key][0]
+                self._drivers.move_to_end(key)
+            else:
+                driver = create()
+            self._drivers[key] = (driver, now)
+            self._evict(now)
+            self._close_retired()
+            return driver
+
+    def _evict(self, now):
+        # the most recently used driver is never evicted, it's about to be
+        # used.
+        while len(self._drivers) > 1:
+            key, (driver, last_used) = next(iter(self._drivers.items()))
+            if (
+                len(self._drivers) <= self.max_size
+                and now - last_used < self.idle_timeout
+            ):
+                break
+            del self._drivers[key]
+            self._retired.append(driver)
+            current_app.logger.info(
+                f"Evicting driver for {key[0]}, {len(self._drivers)} left"
+            )
+
+    def _close_retired(self):
+        still_in_use = []
+        for driver in self._retired:
+            if driver_in_use(driver):
+                still_in_use.append(driver)
+                continue
+            driver.close()
+            with pool_waiters_lock:
+                pool_waiters.pop(driver, None)
+        self._retired = still_in_use
+
+
+def driver_config() -> dict:
+    """Return configuration of new drivers, see config.neo4j_* settings."""
+    return dict(
+        max_connection_pool_size=config.neo4j_max_connection_pool_size,
+        connection_acquisition_timeout=config.neo4j_connection_acquisition_timeout,
+        liveness_check_timeout=config.neo4j_liveness_check_timeout,
+        max_connection_lifetime=config.neo4j_max_connection_lifetime,
+        fetch_size=config.neo4j_fetch_size,
+    )
+
+
+def driver_pool_stats(driver: neo4j.Driver) -> dict:
+    """Return usage of the connection pool of `driver`.
+
+    Contains the number of connections in use and idle per server address,
+    as well as the number of threads waiting for a connection.
+    """
+    # The driver has no public API for this.
+    # pylint: disable=protected-access
+    pool = driver._pool
+    addresses = []
+    with pool.lock:
+        for address, connections in pool.connections.items():
+            in_use = sum(connection.in_use for connection in connections)
+            addresses.append({
+                "address": str(address),
+                "in_use": in_use,
+                "idle": len(connections) - in_use,
+            })
+    with pool_waiters_lock:
+        waiting = pool_waiters.get(driver, 0)
+    return {
+        "max_size": pool.pool_config.max_connection_pool_size,
+        "waiting": waiting,
+        "addresses": addresses,
+    }
+
+
+def pool_stats() -> list[dict]:
+    """Return usage of the connection pools of all drivers of this process."""
+    return [
+        {"host": key[0], **driver_pool_stats(driver)}
+        for key, driver in drivers.items()
+    ]
+
+
+drivers = DriverRegistry(
+    max_size=config.driver_cache_size,
+    idle_timeout=config.driver_idle_timeout,
+)
+
+
+def cached_capability(probe):
+    """Decorator caching results of a Neo4jConnection capability probe.
+
+    Results are shared by all connections to the same host and database
+    and kept for config.capability_cache_ttl seconds. Call the decorated
+    method with refresh=True to bypass the cache.
+    """
+
+    @wraps(probe)
+    def wrapper(self, refresh=False):
+        key = (self.host, self.database)
+        ttl = config.capability_cache_ttl
+        if not refresh and ttl > 0:
+            with capabilities_lock:
+                entry = capabilities.get(key, {}).get(probe.__name__)
+            if entry and monotonic() - entry[1] < ttl:
+                return entry[0]
+
+        value = probe(self)
+        with capabilities_lock:
+            capabilities.setdefault(key, {})[probe.__name__] = (
+                value, monotonic()
+            )
+        return value
+
+    return wrapper
+
+
+def invalidate_capabilities(host, database):
+    """Forget cached capabilities of the given host and database."""
+    with capabilities_lock:
+        capabilities.pop((host, database), None)
+
 
 # We use abort and abort_with_json to break out from a function, so
 # the inconsistent-return-statements warning is a false positive
@@ -47,6 +273,7 @@ class Neo4jConnection:
         return conn
 
 
+    @cached_capability
     def has_ft(self):
         """Return if grapheditor functions/procedures are installed and running.
 
@@ -93,6 +320,7 @@ class Neo4jConnection:
 
         return bool(val)
 
+    @cached_capability
     def has_nft_index(self):
         query_result = self.run("""
         SHOW FULLTEXT INDEXES YIELD name, state
@@ -101,6 +329,66 @@ class Neo4jConnection:
         """, _as_admin=True)
         return query_result.single().value()
 
+    @cached_capability
+    def has_rft_index(self):
+        """Return whether the relationship fulltext index exists, see
+        create_relation_fulltext_index."""
+        query_result = self.run("""
+        SHOW FULLTEXT INDEXES YIELD name, state
+        WHERE state = 'ONLINE'
+        RETURN 'rft' IN collect(name)
+        """, _as_admin=True)
+        return query_result.single().value()
+
+    @cached_capability
+    def search_indexes(self):
+        """Return online TEXT and RANGE indexes usable for searching.
+
+        Return a tuple of (entity type, label or type, property, index type)
+        tuples, where entity type is "NODE" or "RELATIONSHIP". Only indexes
+        on a single label/type and a single property are considered.
+        """
+        query_result = self.run("""
+        SHOW INDEXES
+        YIELD type, entityType, labelsOrTypes, properties, state
+        WHERE state = 'ONLINE' AND type IN ['TEXT', 'RANGE']
+              AND size(labelsOrTypes) = 1 AND size(properties) = 1
+        RETURN entityType, labelsOrTypes[0] AS label_or_type,
+               properties[0] AS property, type
+        """, _as_admin=True)
+        return tuple(
+            (row["entityType"], row["label_or_type"], row["property"], row["type"])
+            for row in query_result
+        )
+
+    def create_relation_fulltext_index(self) -> list[str]:
+        """Create the fulltext index 'rft' on the _ft__tech_ property of
+        relations, the counterpart of the 'nft' index of nodes.
+
+        Fulltext indexes on relations must list their types, so the index
+        covers the types existing now. Drop it and call this again to cover
+        types added later. Return the types indexed.
+        """
+        rel_types = [
+            row["relationshipType"]
+            for row in self.run("CALL db.relationshipTypes()")
+        ]
+        if not rel_types:
+            return []
+        types_expr = "|".join(quote_identifier(rel_type) for rel_type in rel_types)
+        # schema changes can't be part of our transaction, which may contain
+        # writes. So use a session of its own.
+        with self._driver.session(
+                database=self.database, auth=self._session_auth()
+        ) as schema_session:
+            schema_session.run(
+                f"CREATE FULLTEXT INDEX rft IF NOT EXISTS "
+                f"FOR ()-[r:{types_expr}]-() ON EACH [r.`_ft__tech_`]"
+            ).consume()
+        invalidate_capabilities(self.host, self.database)
+        return rel_types
+
+    @cached_capability
     def has_iga_triggers(self):
         """Return whether IGA triggers are installed.
         Used for controlling reset process. Don't call this from a regular
@@ -112,6 +400,7 @@ class Neo4jConnection:
             """, _as_admin=True)
         return result.single().value()
 
+    @cached_capability
     def has_uuids(self):
         """Return whether database contains _uuid__tech_ properties.
         This is useful to tell if a database supports for example
@@ -142,18 +431,70 @@ class Neo4jConnection:
 
     @property
     def _tx(self):
-        """We work transaction based"""
+        """We work transaction based.
+
+        The transaction is opened in the access mode of the current request
+        (see request_access_mode). It lives as long as the app context,
+        which may serve several requests (e.g. test client requests in a
+        single app context). So an open read transaction is replaced by a
+        write transaction if needed. Since nothing could have been written
+        in it, it's simply rolled back.
+        """
+        mode = request_access_mode()
+        if (
+            hasattr(g, "neo4j_transaction")
+            and mode == WRITE
+            and g.neo4j_access_mode == READ
+        ):
+            current_app.logger.debug("Replacing read by write transaction")
+            g.neo4j_transaction.rollback()
+            g.neo4j_session.close()
+            del g.neo4j_transaction
+
         if not hasattr(g, "neo4j_transaction"):
-            g.neo4j_session = self._driver.session(database=self.database)
-            g.neo4j_transaction = g.neo4j_session.begin_transaction()
+            g.neo4j_access_mode = mode
+            # statements run in the transaction, see _reconnect
+            g.neo4j_statement_count = 0
+            g.neo4j_session = self._driver.session(
+                database=self.database,
+                auth=self._session_auth(),
+                default_access_mode=mode,
+                # make sure read sessions see data committed by previous
+                # write sessions, even if routed to a different cluster
+                # member.
+                bookmark_manager=self._driver.execute_query_bookmark_manager,
+            )
+            g.neo4j_transaction = self._begin_transaction(g.neo4j_session)
         return g.neo4j_transaction
 
+    def _begin_transaction(self, neo4j_session):
+        """Begin a transaction in `neo4j_session`.
+
+        This is where we wait for a connection of the pool, so we keep track
+        of waiting threads and log slow acquisitions.
+        """
+        with pool_waiters_lock:
+            pool_waiters[self._driver] += 1
+        start = monotonic()
+        try:
+            return neo4j_session.begin_transaction()
+        finally:
+            duration = monotonic() - start
+            with pool_waiters_lock:
+                pool_waiters[self._driver] -= 1
+            if duration > SLOW_ACQUISITION_DURATION:
+                current_app.logger.warning(
+                    f"Waited {duration:.2f}s for a connection to "
+                    f"{self.host}, pool: {driver_pool_stats(self._driver)}"
+                )
+
     @property
     def _admin_tx(self):
         """This transaction is NOT comitted"""
         if not hasattr(g, "neo4j_admin_transaction"):
             g.neo4j_admin_session = self._driver.session(
-                database=self.database
+                database=self.database,
+                auth=self._session_auth(),
             )
             g.neo4j_admin_transaction = (
                 g.neo4j_admin_session.begin_transaction()
@@ -182,12 +523,15 @@ class Neo4jConnection:
         while retry_count < MAX_RETRIES:
             try:
                 tx = self._admin_tx if _as_admin else self._tx
-                return tx.run(statement, **params)
+                result = run_instrumented(tx.run, statement, **params)
+                if not _as_admin:
+                    g.neo4j_statement_count += 1
+                return result
             except neo4j.exceptions.TokenExpired as e:
                 msg = f"Token expired error: {repr(e)}"
                 current_app.logger.error(msg)
                 # Force regenerating token for connection.
-                self._setup_driver()
+                self._reconnect()
                 retry_count += 1
                 sleep(SLEEP_DURATION)
             except neo4j.exceptions.AuthError as e:
@@ -209,7 +553,7 @@ class Neo4jConnection:
                     msg = f"AuthorizationExpired error: {repr(e)}"
                     current_app.logger.error(msg)
                     # Force regenerating token for connection.
-                    self._setup_driver()
+                    self._reconnect()
                     sleep(SLEEP_DURATION)
                 else:
                     raise
@@ -284,39 +628,78 @@ class Neo4jConnection:
             del g.neo4j_transaction
 
     def cache_key(self):
-        id_token = self.token["id_token"] if self.token else None
-        return (self.host, self.username, self.password, id_token)
+        # SSO users share a single driver per host, their credentials are
+        # passed per session (see _session_auth).
+        if self.token and not self.password:
+            return (self.host, None, None)
+        return (self.host, self.username, self.password)
+
+    def _session_auth(self):
+        """Return credentials to be used when opening a session.
+
+        None means using the driver's credentials.
+        """
+        if self.token and not self.password:
+            return neo4j.bearer_auth(self.token["id_token"])
+        return None
 
     def _setup_driver(self) -> neo4j.Driver:
         # Setting up a driver is expensive, and they should be reused.
-        # Let's cache those.
+        # Let's cache those (see DriverRegistry).
 
-        # Call ensure_valid_token before computing key of this connection,
-        # otherwise an old connection with an expired token may be used.
+        # Refresh the token if needed, since new sessions authenticate
+        # with it (see _session_auth).
         if self.token:
             self.token = ensure_valid_token()
-        key = self.cache_key()
-        with drivers_lock:
-            driver = None
-            if key not in drivers:
-                if self.password:
-                    current_app.logger.debug(f"connecting to {self.host} as {self.username}")
-                    driver = neo4j.GraphDatabase.driver(
-                        self.host, auth=(self.username, self.password)
-                    )
-                    drivers[key] = driver
-                elif self.token:
-                    current_app.logger.debug(f"connecting to {self.host} using stored token.")
-                    driver = neo4j.GraphDatabase.driver(
-                        self.host, auth=neo4j.bearer_auth(self.token["id_token"])
-                    )
-                    # compute cache_key again, since we have a new token.
-                    drivers[self.cache_key()] = driver
-                else:
-                    abort_with_json(401, "Incomplete Neo4jConnection instance.")
-            else:
-                driver = drivers[key]
-            return driver
+        return drivers.get_or_create(self.cache_key(), self._create_driver)
+
+    def _reconnect(self):
+        """Set up the driver again, e.g. after the token expired.
+
+        The open sessions of the request authenticated with the old token,
+        so they are discarded. The next statement opens new ones (see _tx).
+        If statements already ran in the discarded transaction, retrying
+        would commit only the rest of the request, so it's aborted instead.
+        """
+        partial = (
+            hasattr(g, "neo4j_transaction") and g.neo4j_statement_count > 0
+        )
+        for tx_name, session_name in (
+                ("neo4j_transaction", "neo4j_session"),
+                ("neo4j_admin_transaction", "neo4j_admin_session"),
+        ):
+            # The session is broken anyway, so ignore errors when closing.
+            # pylint: disable=broad-exception-caught
+            if hasattr(g, tx_name):
+                try:
+                    g.pop(tx_name).close()
+                except Exception:
+                    pass
+            if hasattr(g, session_name):
+                try:
+                    g.pop(session_name).close()
+                except Exception:
+                    pass
+        if partial:
+            abort_with_json(
+                401, "Token expired during the transaction, nothing was committed."
+            )
+        self._driver = self._setup_driver()
+
+    def _create_driver(self) -> neo4j.Driver:
+        if self.password:
+            current_app.logger.debug(f"connecting to {self.host} as {self.username}")
+            return neo4j.GraphDatabase.driver(
+                self.host,
+                auth=(self.username, self.password),
+                **driver_config()
+            )
+        if self.token:
+            # no driver-level auth, sessions authenticate with the token of
+            # the current user (see _session_auth).
+            current_app.logger.debug(f"connecting to {self.host} for SSO users.")
+            return neo4j.GraphDatabase.driver(self.host, **driver_config())
+        abort_with_json(401, "Incomplete Neo4jConnection instance.")
 
     def get_databases(self):
         """Return all databases available."""
@@ -334,7 +717,7 @@ class Neo4jConnection:
         db_type = ""
         status = None
         if name:
-            result = self.run(f"SHOW DATABASE `{name}`", _as_admin=True).single()
+            result = self.run("SHOW DATABASE $name", name=name, _as_admin=True).single()
             if result:
                 self.database = result.get("name")
                 status = result.get("currentStatus", "")
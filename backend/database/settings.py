@@ -34,5 +34,37 @@ config = AttrDict(
     dev_mode=os.environ.get("GUI_DEV_MODE", "1") == "1",
     force_werkzeug=os.environ.get("GUI_FORCE_WERKZEUG", "0") == "1",
     send_error_messages=os.environ.get("GUI_SEND_ERROR_MESSAGES", "1") == "1",
-    gui_custom_files_dir=os.getenv("GUI_CUSTOM_FILES_DIR","static/custom")
+    gui_custom_files_dir=os.getenv("GUI_CUSTOM_FILES_DIR","static/custom"),
+    # seconds metamodels are cached across requests, 0 disables caching.
+    metamodel_cache_ttl=float(os.environ.get("GUI_METAMODEL_CACHE_TTL", "60")),
+    # seconds results of capability probes (fulltext index, uuids etc.) are
+    # cached, 0 disables caching.
+    capability_cache_ttl=float(os.environ.get("GUI_CAPABILITY_CACHE_TTL", "60")),
+    # connection pool settings of Neo4j drivers (one pool per driver). Durations
+    # are given in seconds. See the Neo4j driver's documentation for details.
+    neo4j_max_connection_pool_size=int(
+        os.environ.get("GUI_NEO4J_MAX_CONNECTION_POOL_SIZE", "100")
+    ),
+    neo4j_connection_acquisition_timeout=float(
+        os.environ.get("GUI_NEO4J_CONNECTION_ACQUISITION_TIMEOUT", "60")
+    ),
+    # unset: idle connections aren't checked before being reused.
+    neo4j_liveness_check_timeout=(
+        float(os.environ["GUI_NEO4J_LIVENESS_CHECK_TIMEOUT"])
+        if os.environ.get("GUI_NEO4J_LIVENESS_CHECK_TIMEOUT") else None
+    ),
+    neo4j_max_connection_lifetime=float(
+        os.environ.get("GUI_NEO4J_MAX_CONNECTION_LIFETIME", "3600")
+    ),
+    # number of records fetched at once when reading results.
+    neo4j_fetch_size=int(os.environ.get("GUI_NEO4J_FETCH_SIZE", "1000")),
+    # maximal number of drivers (each with its own pool) kept per process,
+    # and seconds after which an unused driver is closed.
+    driver_cache_size=int(os.environ.get("GUI_DRIVER_CACHE_SIZE", "100")),
+    driver_idle_timeout=float(os.environ.get("GUI_DRIVER_IDLE_TIMEOUT", "3600")),
+    # searches without a suitable index scan all nodes/relations only if
+    # there are at most this many of them. Otherwise they fail.
+    search_scan_max_elements=int(
+        os.environ.get("GUI_SEARCH_SCAN_MAX_ELEMENTS", "1000000")
+    ),
 )
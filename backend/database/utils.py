@@ -3,7 +3,9 @@ Yes, I know, utils.py is an evil name. TODO
 """
 
 import re
+from functools import lru_cache
 from typing import Callable
+import msgspec
 from flask import abort, current_app, jsonify, make_response
 from database.settings import config
 from database.base_types import BaseElement
@@ -13,22 +15,47 @@ def pascal_case(s):
     return "".join(x for x in s.title() if x.isalnum())
 
 
-def find_a_value(obj: BaseElement, attributes: list[str] | None = None,
-                 keys: list[str] | None =None, default=None):
-    attributes = [] if attributes is None else attributes
-    keys = [] if keys is None else keys
+@lru_cache(maxsize=8192)
+def _key_ranks(
+        obj_key: str, key_lists: tuple[tuple[str, ...], ...]
+) -> tuple[int | None, ...]:
+    """Return for each of key_lists the position of the first key obj_key
+    starts with (case insensitive), None if there is none.
 
-    for key in keys:
-        for obj_key in obj.properties.keys():
-            if obj_key.lower().startswith(key):
-                return obj.properties[obj_key]
+    Property keys repeat across elements, so results are cached.
+    """
+    lower_key = obj_key.lower()
+    return tuple(
+        next(
+            (rank for rank, key in enumerate(keys) if lower_key.startswith(key)),
+            None,
+        )
+        for keys in key_lists
+    )
+
+
+def find_values(obj: BaseElement, key_lists: tuple[tuple[str, ...], ...],
+                defaults: tuple) -> list:
+    """Return a value of obj's properties for each of key_lists, with a
+    single pass over the properties.
+
+    Like find_a_value, the value of the first property key starting with
+    the first matching key of a list is taken, otherwise its default.
+    """
+    values = list(defaults)
+    best_ranks = [None] * len(key_lists)
+    for obj_key, value in obj.properties.items():
+        for i, rank in enumerate(_key_ranks(obj_key, key_lists)):
+            if rank is not None and (best_ranks[i] is None or rank < best_ranks[i]):
+                best_ranks[i] = rank
+                values[i] = value
+    return values
 
-    for attribute in attributes:
-        for obj_key in obj.properties.keys():
-            if obj_key.lower().startswith(attribute):
-                return obj.properties[obj_key]
 
-    return default
+def find_a_value(obj: BaseElement, attributes: list[str] | None = None,
+                 keys: list[str] | None =None, default=None):
+    keys = tuple(keys or ()) + tuple(attributes or ())
+    return find_values(obj, (keys,), (default,))[0]
 
 
 re_multiline_quote = re.compile('"""(.*)"""', re.DOTALL)
@@ -51,6 +78,29 @@ def remove_newlines(s):
     return s.replace("\n", "")
 
 
+def quote_identifier(name: str) -> str:
+    """Quote a label, relation type or property name for use in Cypher.
+
+    Only needed where Cypher doesn't accept parameters, e.g. in schema
+    commands.
+    """
+    return "`" + name.replace("`", "``") + "`"
+
+
+def msgspec_response(data, headers: dict | None = None):
+    """Return data (containing e.g. GraphEditorNode structs) as JSON response.
+
+    Encoding with msgspec is much faster than dumping large results with
+    marshmallow. Endpoints returning this keep their @blp.response schema
+    for the API documentation, so data must correspond to it.
+    """
+    return current_app.response_class(
+        msgspec.json.encode(data),
+        mimetype="application/json",
+        headers=headers,
+    )
+
+
 def abort_with_json(code, msg="", always_send_message=False):
     """Return code to client, together with a JSON object with the
     error description as message.  If msg is not empty and
@@ -22,6 +22,7 @@ from blueprints.maintenance.info_api_v1 import blp as info_api
 from blueprints.maintenance.database_api import blp as database_api
 from blueprints.maintenance.dev_api import blp as dev_api
 from blueprints.maintenance.login_api import blp as login_api
+from blueprints.maintenance.metrics_api_v1 import blp as metrics_api
 from blueprints.graph.node_api_v1 import blp as node_api
 from blueprints.graph.relation_api_v1 import blp as relation_api
 from blueprints.graph.meta_api_v1 import blp as meta_api
@@ -32,8 +33,13 @@ from blueprints.display.perspective_api_v1 import blp as perspective_api
 from blueprints.display.style_api_v1 import blp as style_api
 from blueprints.context_menu_api_v1 import blp as context_menu_api
 
+from database import instrumentation
 from database.auth import oauth
-from database.cypher_database import CypherDatabase
+from database.cypher_database import (
+    CypherDatabase,
+    invalidate_metamodels,
+    metamodel_cache_key,
+)
 from database.neo4j_connection import neo4j_connect
 from database.settings import config
 
@@ -129,6 +135,7 @@ app.logger.setLevel(config.log_level)
 CORS(
     app,
     supports_credentials=True,
+    expose_headers=["X-Pagination"],
     origins=[
         "http://localhost:8080",
         "http://localhost:8081",
@@ -182,6 +189,11 @@ api.register_blueprint(
 
 api.register_blueprint(info_api, url_prefix=f"{api_prefix}/api/v1/info")
 
+api.register_blueprint(metrics_api, url_prefix=f"{api_prefix}/api/v1/metrics")
+
+# registered before our other hooks, so they are measured too.
+instrumentation.init_app(app)
+
 oauth_enabled = "OIDC_CLIENT_ID" in os.environ
 
 # we don't mandate OAuth support. So if the env var OIDC_CLIENT_ID is
@@ -218,6 +230,9 @@ def close_connection(exception):
     app.logger.debug("closing transaction")
     if hasattr(g, "conn"):
         g.conn.close(exception)
+        # invalidate only after committing, see invalidate_metamodels
+        if g.pop("metamodel_changed", False):
+            invalidate_metamodels(metamodel_cache_key(g.conn))
 
 
 def route_requires_connection():
@@ -255,7 +270,7 @@ def prepare_style():
     """Load default style settings.
 
     This is executed on each request in order to always have an up-to-date
-    style configuration.
+    style configuration. The style file is only parsed again if it changed.
     """
     load_default_style()
 
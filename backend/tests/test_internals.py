@@ -1,14 +1,45 @@
+import base64
+from dataclasses import replace
+import json
+import re
+from types import SimpleNamespace
+
+import msgspec
 import pytest
+import neo4j
+from flask import Flask, g
+from flask.views import MethodView
+from werkzeug.exceptions import HTTPException
 
-from database import mapper
+from database import instrumentation, mapper
+from database import cypher_database
+from database.cypher_database import CypherDatabase, invalidate_metamodels
+from database import neo4j_connection
+from database.neo4j_connection import (
+    DriverRegistry,
+    Neo4jConnection,
+    access_mode,
+    cached_capability,
+    invalidate_capabilities,
+    request_access_mode,
+    READ,
+    WRITE,
+)
+from database.base_types import BaseNode, BaseRelation, NodeSearchResult
+from database import id_handling
 from database.id_handling import (
+    compute_semantic_id,
     extract_id_metatype,
     get_base_id,
     parse_semantic_id,
     GraphEditorLabel,
+    SEMANTIC_ID_BUILDERS,
 )
 from database.mapper import python_value_to_cypher
-from database.utils import dict_to_array, split_statements
+from database.settings import config
+from database.utils import (
+    dict_to_array, find_a_value, msgspec_response, split_statements
+)
 
 
 def test_get_base_id():
@@ -108,5 +139,1087 @@ def test_split_statements():
     assert res[0] == "return `;` 23"
 
 
+class RecordedResult(list):
+    """Rows returned by RecordingConnection.run, mimicking neo4j.Result."""
+
+    def single(self):
+        return self[0] if self else None
+
+
+class RecordingConnection:
+    """Stand-in for Neo4jConnection, recording the statements it runs.
+
+    'rows' is either the list of rows every statement returns or a function
+    mapping the statement to its rows.
+    """
+
+    def __init__(self, rows=None):
+        self.host = "bolt://test"
+        self.database = "neo4j"
+        self.statements = []
+        self.rows = rows or []
+        self.doomed = False
+
+    def run(self, query, **params):
+        self.statements.append((query, params))
+        rows = self.rows(query) if callable(self.rows) else self.rows
+        return RecordedResult(rows)
+
+    def doom(self):
+        self.doomed = True
+
+
+# Neo4j element IDs look like "4:0b6b4d7b-7a49-4ea5-8c4b-0a44a7e3a0b4:12"
+ELEMENT_ID_PATTERN = re.compile(r"\d+:[0-9a-f]{8}-[0-9a-f-]{27}:\d+")
+
+
+def assert_parameterized(statements):
+    """Fail if any of the recorded statements contains an element ID literal.
+
+    IDs have to be passed as parameters. Otherwise every distinct ID
+    list results in a new query text, which Neo4j has to plan again.
+    """
+    for query, _ in statements:
+        match = ELEMENT_ID_PATTERN.search(query)
+        assert match is None, f"element ID {match.group()} in query: {query}"
+
+
+def test_metamodel_cache():
+    app = Flask(__name__)
+    conn = RecordingConnection(rows=[{"def_name": "Person__dummy_"}])
+    cypher_database.metamodel_cache.clear()
+    key = cypher_database.metamodel_cache_key(conn)
+
+    with app.app_context():
+        g.conn = conn
+        CypherDatabase().load_metamodels()
+        assert len(conn.statements) == 3
+        assert g.modelled_labels == {"Person__dummy_"}
+
+    with app.app_context():
+        g.conn = conn
+        CypherDatabase().load_metamodels()
+        # served from the cache
+        assert len(conn.statements) == 3
+        assert g.modelled_relation_types == {"Person__dummy_"}
+
+    invalidate_metamodels(key)
+    with app.app_context():
+        g.conn = conn
+        CypherDatabase().load_metamodels()
+        assert len(conn.statements) == 6
+
+
+def test_request_access_mode():
+    app = Flask(__name__)
+
+    class Things(MethodView):
+        def get(self):
+            return request_access_mode()
+
+        def post(self):
+            return request_access_mode()
+
+        @access_mode(READ)
+        def put(self):
+            return request_access_mode()
+
+    class Reset(MethodView):
+        @access_mode(WRITE)
+        def get(self):
+            return request_access_mode()
+
+    app.add_url_rule("/things", view_func=Things.as_view("things"))
+    app.add_url_rule("/reset", view_func=Reset.as_view("reset"))
+
+    client = app.test_client()
+    assert client.get("/things").text == READ
+    assert client.post("/things").text == WRITE
+    assert client.put("/things").text == READ
+    assert client.get("/reset").text == WRITE
+
+
+def test_cached_capability():
+    class Connection:
+        def __init__(self, database):
+            self.host = "bolt://test"
+            self.database = database
+            self.probes = 0
+
+        @cached_capability
+        def has_something(self):
+            self.probes += 1
+            return True
+
+    conn = Connection("db1")
+    invalidate_capabilities(conn.host, conn.database)
+    assert conn.has_something()
+    assert conn.has_something()
+    assert conn.probes == 1
+
+    # shared by connections to the same database
+    other_conn = Connection("db1")
+    assert other_conn.has_something()
+    assert other_conn.probes == 0
+    assert Connection("db2").has_something()
+
+    assert conn.has_something(refresh=True)
+    assert conn.probes == 2
+
+    invalidate_capabilities(conn.host, conn.database)
+    assert conn.has_something()
+    assert conn.probes == 3
+
+
+def test_driver_registry_eviction():
+    app = Flask(__name__)
+    registry = DriverRegistry(max_size=2, idle_timeout=3600)
+
+    def create():
+        return neo4j.GraphDatabase.driver("neo4j://localhost:7687")
+
+    with app.app_context():
+        first = registry.get_or_create("first", create)
+        assert registry.get_or_create("first", create) is first
+        second = registry.get_or_create("second", create)
+        registry.get_or_create("first", create)
+        # "second" is the least recently used driver
+        registry.get_or_create("third", create)
+        assert len(registry) == 2
+        assert [key for key, _ in registry.items()] == ["first", "third"]
+        # unused drivers are closed immediately
+        assert registry.retired_count == 0
+        assert registry.get_or_create("second", create) is not second
+
+        registry.idle_timeout = 0
+        registry.get_or_create("fourth", create)
+        assert [key for key, _ in registry.items()] == ["fourth"]
+        assert registry.retired_count == 0
+
+
+@pytest.fixture
+def sso_tokens(monkeypatch):
+    "Use a fresh driver registry and a new SSO token on each refresh."
+    tokens = iter(f"token{i}" for i in range(1, 100))
+    monkeypatch.setattr(
+        neo4j_connection, "ensure_valid_token", lambda: {"id_token": next(tokens)}
+    )
+    monkeypatch.setattr(
+        neo4j_connection, "drivers", DriverRegistry(max_size=10, idle_timeout=3600)
+    )
+    monkeypatch.setattr(neo4j_connection, "sleep", lambda _: None)
+
+
+def test_sso_driver_sharing(sso_tokens):
+    app = Flask(__name__)
+    host = "neo4j://localhost:7687"
+
+    with app.app_context():
+        alice = Neo4jConnection(host, token={"id_token": "alice"})
+        bob = Neo4jConnection(host, token={"id_token": "bob"})
+        user = Neo4jConnection(host, username="neo4j", password="secret")
+        other_user = Neo4jConnection(host, username="other", password="secret")
+
+        assert alice.cache_key() == bob.cache_key() == (host, None, None)
+        assert user.cache_key() == (host, "neo4j", "secret")
+        assert alice._driver is bob._driver
+        assert user._driver is not alice._driver
+        assert other_user._driver is not user._driver
+        assert len(neo4j_connection.drivers) == 3
+
+        # SSO users authenticate each session with their own token
+        assert alice._session_auth() == neo4j.bearer_auth(alice.token["id_token"])
+        assert bob._session_auth() == neo4j.bearer_auth(bob.token["id_token"])
+        assert alice._session_auth() != bob._session_auth()
+        assert user._session_auth() is None
+
+
+class FakeTransaction:
+    def __init__(self, session):
+        self.session = session
+        self.closed = False
+        self.rolled_back = False
+
+    def run(self, statement, **params):
+        if self.session.expired:
+            raise neo4j.exceptions.TokenExpired("token expired")
+        return IteratorResult([{"value": 1}])
+
+    def rollback(self):
+        self.rolled_back = True
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    def __init__(self, auth, access_mode, expired):
+        self.auth = auth
+        self.access_mode = access_mode
+        self.expired = expired
+        self.closed = False
+
+    def begin_transaction(self):
+        return FakeTransaction(self)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeDriver:
+    execute_query_bookmark_manager = None
+
+    def __init__(self, expired_sessions=0):
+        self.sessions = []
+        # sessions opened before the first refresh of the token are expired
+        self.expired_sessions = expired_sessions
+
+    def session(self, auth, default_access_mode=WRITE, **_):
+        self.sessions.append(FakeSession(
+            auth,
+            default_access_mode,
+            expired=len(self.sessions) < self.expired_sessions,
+        ))
+        return self.sessions[-1]
+
+
+def test_read_transaction_upgraded_for_writes(sso_tokens):
+    "Requests sharing an app context get a write transaction if needed."
+    app = Flask(__name__)
+    host = "neo4j://localhost:7687"
+    driver = FakeDriver()
+    neo4j_connection.drivers.get_or_create((host, None, None), lambda: driver)
+
+    @app.route("/", methods=["GET", "POST"])
+    def run():
+        g.conn.run("RETURN 1 AS value")
+        return ""
+
+    with app.app_context():
+        g.conn = Neo4jConnection(host, token={"id_token": "token"})
+        client = app.test_client()
+        client.get("/")
+        client.get("/")
+        client.post("/")
+        client.post("/")
+        assert [session.access_mode for session in driver.sessions] == [
+            READ, WRITE
+        ]
+        assert driver.sessions[0].closed
+        assert g.neo4j_transaction.session is driver.sessions[1]
+
+
+def test_token_expired_reopens_session(sso_tokens):
+    app = Flask(__name__)
+    host = "neo4j://localhost:7687"
+    driver = FakeDriver(expired_sessions=1)
+    sessions = driver.sessions
+    neo4j_connection.drivers.get_or_create((host, None, None), lambda: driver)
+
+    with app.app_context():
+        conn = Neo4jConnection(host, token={"id_token": "old"})
+        assert list(conn.run("RETURN 1 AS value")) == [{"value": 1}]
+        assert [session.auth for session in sessions] == [
+            neo4j.bearer_auth("token1"), neo4j.bearer_auth("token2")
+        ]
+        assert sessions[0].closed
+        assert not sessions[1].closed
+        assert g.neo4j_session is sessions[1]
+        assert g.neo4j_transaction.session is sessions[1]
+
+
+def test_token_expired_after_write_aborts(sso_tokens):
+    "Requests aren't committed partially if the token expires in between."
+    app = Flask(__name__)
+    host = "neo4j://localhost:7687"
+    driver = FakeDriver()
+    neo4j_connection.drivers.get_or_create((host, None, None), lambda: driver)
+
+    with app.app_context():
+        conn = Neo4jConnection(host, token={"id_token": "old"})
+        conn.run("CREATE (n:Person)")
+        transaction = g.neo4j_transaction
+        driver.sessions[0].expired = True
+        with pytest.raises(HTTPException) as e:
+            conn.run("CREATE (n:Person)")
+        assert e.value.get_response().status_code == 401
+        # the first write is rolled back, nothing is left to commit
+        assert transaction.closed
+        assert driver.sessions[0].closed
+        assert len(driver.sessions) == 1
+        assert not hasattr(g, "neo4j_transaction")
+
+
+def test_bulk_deletes_are_parameterized():
+    app = Flask(__name__)
+    ids = [
+        "id::4:0b6b4d7b-7a49-4ea5-8c4b-0a44a7e3a0b4:12",
+        "id::4:0b6b4d7b-7a49-4ea5-8c4b-0a44a7e3a0b4:13",
+    ]
+    other_ids = ["id::4:0b6b4d7b-7a49-4ea5-8c4b-0a44a7e3a0b4:14"]
+    conn = RecordingConnection(
+        rows=lambda query: (
+            [{"c": 1, "metamodel_changed": False}] if "DELETE" in query else []
+        )
+    )
+
+    with app.app_context():
+        g.conn = conn
+        db = CypherDatabase()
+        db.delete_nodes_by_ids(ids)
+        db.delete_nodes_by_ids(other_ids)
+        db.delete_relations_by_ids(ids)
+        db.delete_relations_by_ids(other_ids)
+
+    assert_parameterized(conn.statements)
+    queries = [query for query, _ in conn.statements if "DELETE" in query]
+    assert len(queries) == 4
+    # the same query text regardless of the IDs
+    assert queries[0] == queries[1]
+    assert queries[2] == queries[3]
+    delete_params = [params for query, params in conn.statements if "DELETE" in query]
+    assert delete_params[0]["raw_db_ids"] == [get_base_id(i) for i in ids]
+
+    with pytest.raises(AssertionError):
+        assert_parameterized([(f"MATCH (n) WHERE elementid(n) = '{ids[0][4:]}'", {})])
+
+
+class SummarizedResult(list):
+    """Rows with a summary, mimicking neo4j.Result."""
+
+    def consume(self):
+        return SimpleNamespace(result_available_after=3, result_consumed_after=2)
+
+
+def test_request_instrumentation():
+    app = Flask(__name__)
+    instrumentation.init_app(app)
+    instrumentation.metrics.clear()
+
+    @app.route("/things/<thing_id>")
+    def things(thing_id):
+        result = instrumentation.run_instrumented(
+            lambda statement, **params: SummarizedResult([1, 2, 3]),
+            "MATCH (n) WHERE elementid(n) = $nid RETURN n",
+            nid=thing_id,
+        )
+        return {"count": len(list(result))}
+
+    client = app.test_client()
+    response = client.get("/things/1")
+    client.get("/things/2")
+
+    timing = response.headers["Server-Timing"]
+    assert 'desc="Neo4j (1 statements, 3 rows)"' in timing
+    assert "neo4j;dur=5.0" in timing
+    assert "total;dur=" in timing
+
+    text = instrumentation.render_metrics()
+    labels = 'method="GET",endpoint="/things/<thing_id>"'
+    assert f"grapheditor_neo4j_statements_total{{{labels}}} 2" in text
+    assert f"grapheditor_neo4j_rows_total{{{labels}}} 6" in text
+    assert f'grapheditor_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+    assert "# TYPE grapheditor_request_duration_seconds histogram" in text
+
+
+class IteratorResult:
+    """Rows of a result which, like neo4j.Result, is its own iterator."""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._rows)
+
+    def consume(self):
+        return SimpleNamespace(result_available_after=1, result_consumed_after=1)
+
+
+class FakeNeoNode(dict):
+    """Stand-in for neo4j.graph.Node."""
+
+    def __init__(self, element_id, labels, properties):
+        super().__init__(properties)
+        self._properties = dict(properties)
+        self.element_id = element_id
+        self.labels = frozenset(labels)
+
+
+def test_update_nodes_batched():
+    app = Flask(__name__)
+
+    def rows(query):
+        return [
+            {"nid": row["nid"], "n": FakeNeoNode(row["nid"], row["added_labels"], row["properties"])}
+            for row in conn.statements[-1][1]["rows"]
+        ]
+
+    conn = RecordingConnection(rows=rows)
+    num_nodes = cypher_database.NODE_UPDATE_BATCH_SIZE * 2 + 1
+    existing_nodes = {
+        f"id::4:db:{i}": BaseNode(
+            element_id=f"4:db:{i}",
+            id=f"4:db:{i}",
+            properties={"_uuid__tech_": str(i), "name": "old"},
+            labels=["Person"],
+            style={},
+        )
+        for i in range(num_nodes)
+    }
+    node_data_map = {
+        nid: {"labels": ["Human"], "properties": {"name": "new"}}
+        for nid in existing_nodes
+    }
+
+    with app.app_context():
+        g.conn = conn
+        updated = CypherDatabase().update_nodes(node_data_map, existing_nodes)
+
+    # one statement per batch, independent of the number of nodes
+    assert len(conn.statements) == 3
+    assert len({query for query, _ in conn.statements}) == 1
+    assert_parameterized(conn.statements)
+    assert list(updated.keys()) == list(existing_nodes.keys())
+    row = conn.statements[0][1]["rows"][0]
+    # tech properties are kept
+    assert row["properties"] == {"_uuid__tech_": "0", "name": "new"}
+    assert row["added_labels"] == ["Human"]
+    assert row["removed_labels"] == ["Person"]
+    assert updated["id::4:db:0"].labels == frozenset(["Human"])
+
+
+class FakeNeoRelation(dict):
+    """Stand-in for neo4j.graph.Relationship."""
+
+    def __init__(self, element_id, rel_type, properties):
+        super().__init__(properties)
+        self._properties = dict(properties)
+        self.element_id = element_id
+        self.id = None
+        self.start_node = SimpleNamespace(element_id="4:db:source")
+        self.end_node = SimpleNamespace(element_id="4:db:target")
+        self.type = rel_type
+
+
+def test_compact_base_types():
+    neo_nodes = [
+        FakeNeoNode(f"4:db:{i}", ["Person", "Employee"], {"name": f"Bob {i}"})
+        for i in range(2)
+    ]
+    nodes = [BaseNode.from_neo_node(n) for n in neo_nodes]
+
+    # equal label sets are shared, properties aren't copied
+    assert nodes[0].labels is nodes[1].labels
+    assert nodes[0].properties == {"name": "Bob 0"}
+    with pytest.raises(TypeError):
+        nodes[0].properties["name"] = "Alice"
+    neo_nodes[0]._properties["age"] = 42
+    assert nodes[0].properties["age"] == 42
+    assert not hasattr(nodes[0], "__dict__")
+    assert nodes[0].fields_dict()["element_id"] == "4:db:0"
+
+    relation = BaseRelation.from_neo_relation(FakeNeoRelation("5:db:1", "knows", {}))
+    assert (relation.source_id, relation.target_id) == ("4:db:source", "4:db:target")
+
+
+def test_update_relations_batched():
+    app = Flask(__name__)
+
+    def rows(query):
+        return [
+            {
+                "rid": row["rid"],
+                "r": FakeNeoRelation(
+                    f"new-{row['rid']}" if row["new_type"] else row["rid"],
+                    row["new_type"] or "likes",
+                    row["properties"],
+                ),
+            }
+            for row in conn.statements[-1][1]["rows"]
+        ]
+
+    conn = RecordingConnection(rows=rows)
+    existing_relations = {
+        f"id::5:db:{i}": BaseRelation(
+            element_id=f"5:db:{i}",
+            id=i,
+            properties={"_uuid__tech_": str(i)},
+            source_id="4:db:source",
+            target_id="4:db:target",
+            style={},
+            type="likes",
+        )
+        for i in range(5)
+    }
+    relation_data_map = {
+        rid: {"type": "hates"} if i < 2 else {"properties": {"since": 2000}}
+        for i, rid in enumerate(existing_relations)
+    }
+
+    with app.app_context():
+        g.conn = conn
+        updated = CypherDatabase().update_relations(
+            relation_data_map, existing_relations
+        )
+
+    # one statement for property updates, one for type changes
+    assert len(conn.statements) == 2
+    assert_parameterized(conn.statements)
+    assert updated["id::5:db:0"].type == "hates"
+    assert updated["id::5:db:0"].element_id == "new-5:db:0"
+    assert updated["id::5:db:4"].properties == {"_uuid__tech_": "4", "since": 2000}
+
+
+def test_node_relations_single_statement():
+    app = Flask(__name__)
+    node = FakeNeoNode("4:db:1", ["Person"], {})
+    neighbor = FakeNeoNode("4:db:2", ["Person"], {})
+    loop = FakeNeoRelation("5:db:1", "likes", {})
+    outgoing = FakeNeoRelation("5:db:2", "likes", {})
+    rows = [
+        {"r": loop, "neighbor": node, "is_outgoing": True, "is_incoming": True},
+        {"r": loop, "neighbor": node, "is_outgoing": True, "is_incoming": True},
+        {"r": outgoing, "neighbor": neighbor, "is_outgoing": True, "is_incoming": False},
+    ]
+    filters = {"direction": "both"}
+
+    with app.app_context():
+        g.conn = RecordingConnection(rows=rows)
+        rels = CypherDatabase().get_node_relations("id::4:db:1", filters)
+        assert len(g.conn.statements) == 1
+        assert [(r["relation"].element_id, r["direction"]) for r in rels] == [
+            ("5:db:1", "incoming"),
+            ("5:db:1", "outgoing"),
+            ("5:db:2", "outgoing"),
+        ]
+
+        g.conn = RecordingConnection(rows=rows)
+        rels = CypherDatabase().get_node_relations(
+            "id::4:db:1", {"direction": "incoming"}
+        )
+        assert [r["relation"].element_id for r in rels] == ["5:db:1"]
+
+        # existing node without relations
+        g.conn = RecordingConnection(rows=[{"r": None, "neighbor": None}])
+        assert CypherDatabase().get_node_relations("id::4:db:1", filters) == []
+
+        # unknown node
+        g.conn = RecordingConnection(rows=[])
+        assert CypherDatabase().get_node_relations("id::4:db:1", filters) is None
+        assert len(g.conn.statements) == 1
+        assert CypherDatabase().get_node_relations(
+            "MetaLabel::Person", filters
+        ) == []
+
+
+def test_nodes_neighbors_both_directions():
+    app = Flask(__name__)
+    a = FakeNeoNode("4:db:1", ["Person"], {})
+    b = FakeNeoNode("4:db:2", ["Person"], {})
+    conn = RecordingConnection(rows=[
+        {"original_id": "id::4:db:0", "n": a},
+        {"original_id": "id::4:db:0", "n": b},
+    ])
+
+    with app.app_context():
+        g.conn = conn
+        result = CypherDatabase().get_nodes_neighbors(
+            {"id::4:db:0": "4:db:0"}, ["likes"], "both",
+            incoming_relation_types=["hates"]
+        )
+
+    assert len(conn.statements) == 1
+    query, params = conn.statements[0]
+    assert "(m)-[r]->(n)" in query and "(m)<-[r]-(n)" in query
+    assert params["outgoing_relation_types"] == ["likes"]
+    assert params["incoming_relation_types"] == ["hates"]
+    assert list(result["id::4:db:0"].keys()) == ["4:db:1", "4:db:2"]
+
+    with app.app_context():
+        g.conn = conn
+        CypherDatabase().get_nodes_neighbors({"id::4:db:0": "4:db:0"}, [], "incoming")
+    query, params = conn.statements[1]
+    assert "(m)-[r]->(n)" not in query
+    assert params["outgoing_relation_types"] is None
+
+    # no direction to expand would give an invalid query
+    with app.app_context():
+        g.conn = conn
+        with pytest.raises(ValueError):
+            CypherDatabase().get_nodes_neighbors({"id::4:db:0": "4:db:0"}, [], "up")
+    assert len(conn.statements) == 2
+
+
+def test_parallax_steps_single_statement():
+    app = Flask(__name__)
+    conn = RecordingConnection(
+        rows=lambda query: (
+            [{"n": FakeNeoNode("4:db:9", ["Person"], {}), "nid": "4:db:9"}]
+            if "steps" in query else []
+        )
+    )
+    steps = [
+        {"outgoing": ["likes"], "incoming": [], "filters": None},
+        {"outgoing": ["likes"], "incoming": ["knows"], "filters": {"labels": ["Person"]}},
+        {"outgoing": [], "incoming": ["knows"], "filters": {"properties": {"name": "a"}}},
+    ]
+
+    with app.app_context():
+        g.conn = conn
+        result = CypherDatabase().get_parallax_nodes(["id::4:db:1"], None, steps)
+
+    assert list(result.keys()) == ["id::4:db:9"]
+    query, params = conn.statements[-1]
+    # no statement per step
+    assert len(conn.statements) == 2
+    assert query.count("CALL (n)") == 3
+    assert params["raw_db_ids"] == ["4:db:1"]
+    assert params["steps"][1] == {
+        "outgoing": ["likes"], "incoming": ["knows"], "labels": ["Person"], "properties": {}
+    }
+
+
+def test_nodes_summary():
+    app = Flask(__name__)
+    conn = RecordingConnection(rows=[{
+        "incoming": [["likes", 3]],
+        "outgoing": [["likes", 1], ["knows", 2]],
+        "labels": ["Person", "Human"],
+        "properties": ["name", "_uuid__tech_", ""],
+    }])
+
+    with app.app_context():
+        g.conn = conn
+        summary = CypherDatabase().get_nodes_summary(["4:db:1", "4:db:2"])
+
+    assert len(conn.statements) == 1
+    assert summary == {
+        "incoming": {"likes": 3},
+        "outgoing": {"likes": 1, "knows": 2},
+        "labels": ["Human", "Person"],
+        "properties": ["_uuid__tech_", "name"],
+    }
+
+
+def test_query_nodes_page():
+    app = Flask(__name__)
+    page = [{
+        "nodes": [FakeNeoNode("4:db:3", ["Person"], {})],
+        "total": 120,
+        "estimated": False,
+    }]
+    conn = RecordingConnection(
+        rows=lambda query: [{"c": 10}] if "count(" in query else page
+    )
+    conn.has_nft_index = lambda: False
+
+    with app.app_context():
+        g.conn = conn
+        result = CypherDatabase().query_nodes("ali", [], False, limit=50, skip=100)
+
+    assert [n.element_id for n in result.nodes] == ["4:db:3"]
+    assert result.total == 120
+    query, params = conn.statements[-1]
+    assert "$skip" in query and params["skip"] == 100 and params["limit"] == 50
+
+
+def test_search_strategy(monkeypatch):
+    app = Flask(__name__)
+    monkeypatch.setattr(config, "search_scan_max_elements", 100)
+    element_id = "4:0b6b4d7b-7a49-4ea5-8c4b-0a44a7e3a0b4:12"
+    db = CypherDatabase()
+
+    def strategy(num_elements, text, indexes=(), labels=None):
+        conn = RecordingConnection(rows=[{"c": num_elements}])
+        conn.search_indexes = lambda: indexes
+        with app.app_context():
+            g.conn = conn
+            return db._search_strategy("NODE", text, False, labels), conn
+
+    assert strategy(100, "ali")[0] == cypher_database.SEARCH_SCAN
+    assert strategy(101, "", labels=["Person"])[0] == cypher_database.SEARCH_SCAN
+    assert strategy(101, element_id)[0] == cypher_database.SEARCH_ID
+
+    indexes = (
+        ("NODE", "Person", "name", "TEXT"),
+        ("NODE", "Person", "_ft__tech_", "RANGE"),
+        ("RELATIONSHIP", "knows", "since", "RANGE"),
+    )
+    assert strategy(101, "ali", indexes)[0] == cypher_database.SEARCH_INDEX
+    # indexes of other labels don't help
+    with pytest.raises(HTTPException) as e:
+        strategy(101, "ali", indexes, labels=["Company"])
+    assert e.value.get_response().status_code == 400
+
+    _, conn = strategy(101, "ali", indexes)
+    with app.app_context():
+        g.conn = conn
+        query = db._index_search_query_str("NODE")
+    assert "MATCH (n:`Person`) WHERE n.`name` CONTAINS $text" in query
+    assert "_ft__tech_" not in query and "knows" not in query
+
+
+def test_compact_view(monkeypatch):
+    def no_style(obj):
+        raise AssertionError("style rules applied in compact view")
+
+    monkeypatch.setattr(mapper, "apply_style_rules", no_style)
+    base_node = BaseNode(
+        element_id="4:db:1",
+        id="4:db:1",
+        properties={"name": "Alice", "description": "A person"},
+        style={},
+        labels=["Person"],
+    )
+    node = mapper.GraphEditorNode.from_base_node(base_node, mapper.VIEW_COMPACT)
+    compact = mapper.element_view(node, mapper.VIEW_COMPACT)
+
+    assert compact["title"] == "Alice"
+    assert compact["description"] == "A person"
+    assert compact["labels"] == ["MetaLabel::Person"]
+    assert not mapper.COMPACT_OMITTED_FIELDS & compact.keys()
+    assert mapper.element_view(node, mapper.VIEW_FULL) is node
+    # the long description is built on demand instead
+    assert "<th>name</th><td> Alice</td>" in mapper.long_description(base_node)
+
+
+def test_find_display_values():
+    node = BaseNode(
+        element_id="4:db:7",
+        id="4:db:7",
+        # "title" comes before "name", but name has priority
+        properties={
+            "title": "Dr.",
+            "NAME_first": "Alice",
+            "name": "Alice Liddell",
+            "descriptionShort": "Short",
+            "long_description": "Long",
+        },
+        style={},
+        labels=["Person"],
+    )
+    title, description, long_desc = mapper.find_display_values(node)
+    assert title == mapper.get_node_title(node) == "Alice"
+    assert description == find_a_value(node, keys=mapper.DESCRIPTION_KEYS) == "Short"
+    assert long_desc == mapper.long_description(node) == "Long"
+
+    relation = BaseRelation(
+        element_id="5:db:1", id=1, properties={}, style={},
+        type="knows", source_id="4:db:1", target_id="4:db:2",
+    )
+    assert mapper.find_display_values(relation) == [
+        "knows", mapper.DEFAULT_DESCRIPTION, mapper.DEFAULT_LONG_DESCRIPTION
+    ]
+
+
+def test_msgspec_matches_marshmallow(monkeypatch):
+    "Encoding structs with msgspec gives the same JSON as marshmallow."
+    from blueprints.graph import node_model, relation_model
+
+    monkeypatch.setattr(mapper, "apply_style_rules", lambda obj: obj)
+    nodes = {
+        f"id::4:db:{i}": mapper.GraphEditorNode.from_base_node(
+            BaseNode(
+                element_id=f"4:db:{i}",
+                id=f"4:db:{i}",
+                properties={
+                    # titles may be of any type
+                    "name": f"Bob number {i}" if i % 2 else i,
+                    "tags": ["a", "b"],
+                    "_uuid__tech_": f"uuid-{i}",
+                },
+                style={"color": "red"},
+                labels=["Person"],
+            )
+        )
+        for i in range(10)
+    }
+    nodes["MetaLabel::Person"] = mapper.GraphEditorNode.create_pseudo_node(
+        "MetaLabel::Person"
+    )
+    relations = {
+        "id::5:db:1": mapper.GraphEditorRelation.from_base_relation(
+            BaseRelation(
+                element_id="5:db:1", id=1, properties={"since": 2020},
+                style={}, type="knows", source_id="4:db:1", target_id="4:db:2",
+            )
+        )
+    }
+    app = Flask(__name__)
+
+    with app.app_context():
+        for schema, data in (
+                (node_model.NodeBulkFetchResponseSchema(), {"nodes": nodes}),
+                (relation_model.RelationBulkFetchResponseSchema(), {"relations": relations}),
+        ):
+            marshmallow_json = json.dumps(schema.dump(data))
+            msgspec_json = msgspec_response(data).get_data()
+            assert json.loads(msgspec_json) == json.loads(marshmallow_json)
+
+
+def test_semantic_id_memo():
+    "Semantic IDs of repeated keys are memoized and shared."
+    metalabel = GraphEditorLabel.MetaProperty
+    keys = [f"property_{i}" for i in range(10)]
+    memo = SEMANTIC_ID_BUILDERS[metalabel]
+    memo.cache_clear()
+    id_handling._get_base_id.cache_clear()
+
+    first = [get_base_id(compute_semantic_id(key, metalabel)) for key in keys]
+    assert memo.cache_info().hits == 0
+    assert memo.cache_info().misses == len(keys)
+    assert id_handling._get_base_id.cache_info().misses == len(keys)
+
+    second = [get_base_id(compute_semantic_id(key, metalabel)) for key in keys]
+    assert memo.cache_info().hits == len(keys)
+    assert id_handling._get_base_id.cache_info().hits == len(keys)
+    assert second == first == keys
+    assert all(a is b for a, b in zip(first, second))
+    assert compute_semantic_id(keys[0], metalabel) is memo(keys[0])
+    assert memo(keys[0]) == memo.__wrapped__(keys[0])
+
+
+def test_search_cursor():
+    from blueprints.graph.node_api_v1 import _decode_cursor, _encode_cursor
+
+    assert _decode_cursor(_encode_cursor(50)) == 50
+    app = Flask(__name__)
+    tampered = [
+        base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+        for value in ({"skip": -1}, {"skip": "10"}, {"offset": 10}, [10])
+    ]
+    with app.app_context():
+        for cursor in ["not a cursor", "!!!", _encode_cursor(50)[:-3]] + tampered:
+            with pytest.raises(HTTPException) as e:
+                _decode_cursor(cursor)
+            assert e.value.get_response().status_code == 400
+
+
+def test_relation_routes():
+    from flask_smorest import Api
+    from blueprints.graph.relation_api_v1 import blp as relation_api
+
+    app = Flask(__name__)
+    app.config.update(
+        API_TITLE="test", API_VERSION="1", OPENAPI_VERSION="3.0.3"
+    )
+    Api(app).register_blueprint(relation_api, url_prefix="/api/v1/relations")
+    methods = {
+        rule.rule: rule.methods - {"HEAD", "OPTIONS"}
+        for rule in app.url_map.iter_rules()
+    }
+
+    assert methods["/api/v1/relations/<rid>"] == {"GET", "PUT", "PATCH", "DELETE"}
+    assert methods["/api/v1/relations/<rid>/long_description"] == {"GET"}
+
+
+def test_load_perspective_instrumented():
+    app = Flask(__name__)
+    node = FakeNeoNode("4:db:1", ["Person"], {"_uuid__tech_": "u1"})
+    row = {
+        "p": {
+            "positions__tech_": [
+                msgspec.json.encode({"_uuid": "u1", "x": 1.0, "y": 2.0, "z": 0.0})
+            ],
+            "name__tech_": "Sample",
+            "description__tech_": "",
+        },
+        "nodes": [node],
+        "relations": [],
+    }
+    conn = RecordingConnection()
+    conn.run = lambda query, **params: instrumentation.run_instrumented(
+        lambda statement, **p: IteratorResult([row]), query, **params
+    )
+
+    with app.app_context():
+        g.conn = conn
+        perspective = CypherDatabase().get_perspective_by_id("id::4:db:9")
+        stats = instrumentation.request_stats()
+
+    assert perspective["name"] == "Sample"
+    assert perspective["nodes"]["4:db:1"].style == {"x": 1.0, "y": 2.0, "z": 0.0}
+    assert (stats.statements, stats.rows) == (1, 1)
+
+
+@pytest.fixture
+def node_api_client(monkeypatch):
+    "Test client of the node API, using a CypherDatabase over g.conn."
+    from flask_smorest import Api
+    from blueprints.graph.node_api_v1 import blp as node_api
+
+    monkeypatch.setattr(mapper, "apply_style_rules", lambda obj: obj)
+    app = Flask(__name__)
+    app.config.update(
+        API_TITLE="test", API_VERSION="1", OPENAPI_VERSION="3.0.3"
+    )
+    Api(app).register_blueprint(node_api, url_prefix="/api/v1/nodes")
+    app.graph_db = CypherDatabase()
+    return app.test_client()
+
+
+def test_node_relations_fetch_metarelations_once(node_api_client, monkeypatch):
+    app = node_api_client.application
+    node = FakeNeoNode("4:db:0", ["Person"], {})
+    types = ["likes", "knows", "owns"]
+    rows = [
+        {
+            "r": FakeNeoRelation(f"5:db:{i}", types[i % 3], {}),
+            "neighbor": FakeNeoNode(f"4:db:{i + 1}", ["Person"], {}),
+            "is_outgoing": True,
+            "is_incoming": False,
+        }
+        for i in range(60)
+    ]
+    lookups = []
+
+    def get_nodes_by_ids(ids, filters=None):
+        lookups.append(sorted(ids))
+        metarelation = compute_semantic_id("likes", GraphEditorLabel.MetaRelation)
+        return {
+            metarelation: BaseNode.from_neo_node(
+                FakeNeoNode("4:db:meta", ["MetaRelation__tech_"], {})
+            )
+        }
+
+    def get_node_by_id(nid):
+        raise AssertionError(f"get_node_by_id({nid}) called")
+
+    monkeypatch.setattr(app.graph_db, "get_nodes_by_ids", get_nodes_by_ids)
+    monkeypatch.setattr(app.graph_db, "get_node_by_id", get_node_by_id)
+
+    @app.before_request
+    def connect():
+        g.conn = RecordingConnection(rows=rows)
+
+    response = node_api_client.post(
+        f"/api/v1/nodes/id::{node.element_id}/relations", json={}
+    )
+
+    assert response.status_code == 200
+    relations = response.get_json()["relations"]
+    assert len(relations) == 60
+    assert lookups == [sorted(
+        compute_semantic_id(rel_type, GraphEditorLabel.MetaRelation)
+        for rel_type in types
+    )]
+    metarelations = {
+        rel["relation"]["type"]: rel["metarelation"]["id"] for rel in relations
+    }
+    assert metarelations == {
+        compute_semantic_id(rel_type, GraphEditorLabel.MetaRelation): (
+            "id::4:db:meta" if rel_type == "likes"
+            else compute_semantic_id(rel_type, GraphEditorLabel.MetaRelation)
+        )
+        for rel_type in types
+    }
+
+
+def test_search_pagination(node_api_client, monkeypatch):
+    app = node_api_client.application
+    nodes = [
+        BaseNode.from_neo_node(FakeNeoNode(f"4:db:{i}", ["Person"], {}))
+        for i in range(5)
+    ]
+
+    def query_nodes(text, labels, pseudo, limit=None, skip=0):
+        page = nodes[skip:skip + limit] if limit else nodes[skip:]
+        return NodeSearchResult(nodes=page, total=len(nodes), estimated=False)
+
+    monkeypatch.setattr(app.graph_db, "query_nodes", query_nodes)
+
+    pages = []
+    url = "/api/v1/nodes?limit=2"
+    while url:
+        response = node_api_client.get(url)
+        assert response.status_code == 200
+        pagination = json.loads(response.headers["X-Pagination"])
+        assert pagination["total"] == 5
+        assert pagination["total_is_estimate"] is False
+        pages.append([node["id"] for node in response.get_json()])
+        cursor = pagination["next_cursor"]
+        url = f"/api/v1/nodes?limit=2&cursor={cursor}" if cursor else None
+
+    assert pages == [
+        ["id::4:db:0", "id::4:db:1"],
+        ["id::4:db:2", "id::4:db:3"],
+        ["id::4:db:4"],
+    ]
+    # without limit, everything is on the last page
+    response = node_api_client.get("/api/v1/nodes")
+    assert json.loads(response.headers["X-Pagination"])["next_cursor"] is None
+    assert len(response.get_json()) == 5
+
+    response = node_api_client.get("/api/v1/nodes?limit=2&cursor=tampered")
+    assert response.status_code == 400
+
+
+def test_bulk_patch_same_node(node_api_client, monkeypatch):
+    "Patches may address a node by several IDs, or miss deleted nodes."
+    app = node_api_client.application
+    node = BaseNode(
+        element_id="4:db:1",
+        id="4:db:1",
+        properties={"_uuid__tech_": "1", "name": "old"},
+        labels=["MetaLabel__tech_"],
+        style={},
+    )
+    deleted = {"4:db:2"}
+
+    def rows(query):
+        return [
+            {"nid": row["nid"], "n": FakeNeoNode(row["nid"], ["MetaLabel__tech_"], row["properties"])}
+            for row in conn.statements[-1][1]["rows"]
+            if row["nid"] not in deleted
+        ]
+
+    conn = RecordingConnection(rows=rows)
+    monkeypatch.setattr(
+        app.graph_db,
+        "get_nodes_by_ids",
+        lambda ids, filters=None: {
+            nid: node if nid != "id::4:db:2" else replace(
+                node, element_id="4:db:2", id="4:db:2"
+            )
+            for nid in ids
+        },
+    )
+
+    @app.before_request
+    def connect():
+        g.conn = conn
+
+    def name_patch(nid, name):
+        return {"id": nid, "properties": {"name": {"type": "string", "value": name}}}
+
+    response = node_api_client.patch("/api/v1/nodes/bulk_patch", json={
+        "patches": [
+            name_patch("id::4:db:1", "first"),
+            name_patch("MetaLabel::Person", "second"),
+        ]
+    })
+
+    assert response.status_code == 200
+    nodes = response.get_json()["nodes"]
+    assert set(nodes) == {"id::4:db:1", "MetaLabel::Person"}
+    # changes of the same node are merged into one row, later ones win
+    assert [row["properties"] for row in conn.statements[0][1]["rows"]] == [
+        {"_uuid__tech_": "1", "name": "second"}
+    ]
+    assert not conn.doomed
+
+    response = node_api_client.patch("/api/v1/nodes/bulk_patch", json={
+        "patches": [
+            name_patch("id::4:db:1", "first"),
+            name_patch("id::4:db:2", "second"),
+        ]
+    })
+    assert response.status_code == 400
+    assert conn.doomed
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
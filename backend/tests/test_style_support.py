@@ -1,10 +1,17 @@
 import re
-from flask import Flask
+from flask import Flask, g
 import pytest
 from pyparsing import ParseException
 
-from blueprints.display.style_support import parse_style, apply_style_rules
-from database.base_types import BaseNode
+from blueprints.display import style_support
+from blueprints.display.style_support import (
+    parse_style,
+    apply_style_rules,
+    load_default_style,
+    StyleRuleIndex,
+)
+from database.base_types import BaseNode, BaseRelation
+from database.settings import config
 
 app = Flask(__name__)
 
@@ -276,6 +283,113 @@ def test_no_access_to_disk():
     assert "is not defined" in caption
 
 
+def test_default_style_parsed_once(tmp_path, monkeypatch):
+    "The default style file is only parsed again after it changed."
+    style_file = tmp_path / "custom" / "style.grass"
+    style_file.parent.mkdir()
+    style_file.write_text('node { caption: "first"; }')
+    monkeypatch.setattr(config, "gui_custom_files_dir", str(tmp_path))
+    monkeypatch.setenv("GRAPHEDITOR_BASEDIR", str(tmp_path))
+
+    with app.test_request_context(headers={"X-Custom": "custom"}):
+        load_default_style()
+        first_rules = g.DEFAULT_STYLE_RULES
+        load_default_style()
+        assert g.DEFAULT_STYLE_RULES is first_rules
+        assert first_rules[0].props["caption"] == "first"
+
+        style_file.write_text('node { caption: "second one"; }')
+        load_default_style()
+        assert g.DEFAULT_STYLE_RULES is not first_rules
+        assert g.DEFAULT_STYLE_RULES[0].props["caption"] == "second one"
+
+
+def test_rule_index_keeps_ordering():
+    "Rules dispatched by label or type give the same results as a full scan."
+    style_text = """
+    node { color: red; caption: "generic"; }
+    node.Person__dummy_ { color: blue; }
+    relationship { color: green; }
+    node.Employee__dummy_ { color: yellow; caption: "employee"; }
+    node.* { diameter: 10px; }
+    relationship.likes__dummy_ { caption: "likes"; }
+    node.Person__dummy_ { caption*: "'person ' + p.name__dummy_"; }
+    relationship.* { color: black; }
+    """
+    styles = parse_style(style_text)
+    index = StyleRuleIndex(styles)
+    employee = BaseNode(
+        element_id="125",
+        id="alice",
+        labels=["Employee__dummy_", "Person__dummy_"],
+        properties={"name__dummy_": "Alice"},
+        style={},
+    )
+    likes = BaseRelation(
+        element_id="126",
+        id="126",
+        properties={},
+        style={},
+        type="likes__dummy_",
+        source_id=bob_node.element_id,
+        target_id=employee.element_id,
+    )
+    unlabeled = BaseNode(
+        element_id="127", id="127", labels=[], properties={}, style={}
+    )
+
+    for element in [bob_node, employee, likes, unlabeled]:
+        expected = dict(apply_style_rules(element, styles).style)
+        assert apply_style_rules(element, index).style == expected
+
+    assert apply_style_rules(employee, index).style == {
+        "color": "yellow",
+        "caption": "person Alice",
+        "diameter": "10px",
+    }
+    assert apply_style_rules(likes, index).style == {
+        "color": "black",
+        "caption": "likes",
+    }
+
+
+def test_compiled_code_cache():
+    "Style code is compiled once and the byte code reused for every node."
+    style_text = "\n".join(
+        f"""
+        node.Person__dummy_ {{
+            condition: "len(p.name__dummy_) > {i}";
+            caption*: "p.name__dummy_ + ' {i}'";
+        }}
+        """
+        for i in range(10)
+    )
+    styles = parse_style(style_text)
+    nodes = [
+        BaseNode(
+            element_id=str(i),
+            id=str(i),
+            labels=["Person__dummy_"],
+            properties={"name__dummy_": f"Bob number {i}"},
+            style={},
+        )
+        for i in range(200)
+    ]
+
+    style_support.compile_style_code.cache_clear()
+    for node in nodes:
+        apply_style_rules(node, styles)
+    cache_info = style_support.compile_style_code.cache_info()
+
+    # 10 conditions and 10 captions, compiled once each
+    assert cache_info.misses == 20
+    assert cache_info.hits > 0
+    code = "p.name__dummy_ + ' 9'"
+    assert style_support.compile_style_code(code) is style_support.compile_style_code(code)
+    assert style_support.compile_style_code.cache_info().hits > cache_info.hits
+    assert nodes[-1].style["caption"] == "Bob number 199 9"
+
+
 # Not working yet
 # def test_infinite_loop_causes_timeout():
 #     style_text = """
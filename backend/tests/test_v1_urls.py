@@ -667,6 +667,46 @@ def test_patch_relation():
     assert response.json["properties"]["MetaProperty::years"]["value"] == 4
 
 
+def test_delete_relation():
+    source_id = fetch_sample_node_id(client, "bob")
+    target_id = fetch_sample_node_id(client, "alice")
+    rid = create_sample_relation(
+        client=client,
+        rel_type="MetaRelation::works_with",
+        source=source_id,
+        target=target_id,
+    )["id"]
+    response = client.delete(
+        BASE_URL + f"/api/v1/relations/{rid}",
+        headers=HEADERS,
+    )
+    assert response.status_code == 200
+    assert response.json["num_deleted"] == 1
+
+    response = client.get(
+        BASE_URL + f"/api/v1/relations/{rid}",
+        headers=HEADERS,
+    )
+    assert response.status_code == 404
+
+
+def test_relation_long_description():
+    rid = fetch_sample_relation_id(client)
+    response = client.get(
+        BASE_URL + f"/api/v1/relations/{rid}/long_description",
+        headers=HEADERS,
+    )
+    assert response.status_code == 200
+    assert response.json["longDescription"].startswith("<table>")
+
+    # only GET is served there
+    response = client.delete(
+        BASE_URL + f"/api/v1/relations/{rid}/long_description",
+        headers=HEADERS,
+    )
+    assert response.status_code == 405
+
+
 def test_bulk_fetch_nodes():
     alice_id = fetch_sample_node_id(client, text="alice")
     person_id = "MetaLabel::Person__dummy_"